@@ -0,0 +1,107 @@
+import argparse
+import os
+import sys
+import time
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lernsax.mail import Mail, MailPage, extract_mails  # noqa: E402
+from pages import listing_page  # noqa: E402
+
+
+# the listing parser as it was before MailPage: full parse of the page and one find per column
+def legacy_extract_mails(mail_page_text: str) -> list[Mail]:
+    soup = BeautifulSoup(mail_page_text, features="html.parser")
+    c = soup.find("div", {"class": "jail_table"})
+    mails = []
+    for mail in c.find("tbody").find_all("tr"):
+        read_status = {
+            "../pics/mail_0.svg": [False, False, False],
+            "../pics/mail_1.svg": [False, False, True],
+            "../pics/mail_2.svg": [False, True, False],
+            "../pics/mail_3.svg": [False, True, True],
+            "../pics/mail_4.svg": [True, False, False],
+            "../pics/mail_5.svg": [True, False, True],
+            "../pics/mail_6.svg": [True, True, False],
+            "../pics/mail_7.svg": [True, True, True]
+        }.get(mail.find("td", {"class": "c_env"}).find("img")["src"], ["unidentified"]*3)
+        author_part = mail.find("td", {"class": "c_from"})
+        recipient_part = mail.find("td", {"class": "c_to"})
+        mails.append(Mail(**{
+            "read_status": read_status,
+            "read_link": mail.find("td", {"class": "c_subj"}).find("a")["data-popup"],
+            "subject": mail.find("td", {"class": "c_subj"}).find("a").text.strip(),
+            "author_name": author_part.find("span").text.strip() if author_part else "",
+            "author_address": author_part.find("span")["title"] if author_part else "",
+            "recipient_name": recipient_part.find("span").text.strip() if recipient_part else "",
+            "recipient_address": recipient_part.find("span")["title"] if recipient_part else "",
+            "size": mail.find("td", {"class": "c_size"}).text.strip(),
+            "date": mail.find("td", {"class": "c_date"}).text.strip(),
+            "number": mail.find("td", {"class": "c_cb"}).find("input")["name"].split("[")[1].split("]")[0],
+            "content": None,
+        }))
+    return mails
+
+
+def available_parsers() -> list[str]:
+    parsers = ["html.parser"]
+    try:
+        import lxml  # noqa: F401
+        parsers.append("lxml")
+    except ImportError:
+        pass
+    return parsers
+
+
+def measure(func, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing of a mail listing page")
+    parser.add_argument("--page", help="recorded listing page (html), a synthetic page is used otherwise")
+    parser.add_argument("--rows", type=int, default=100, help="rows of the synthetic page")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.page:
+        with open(args.page, "r") as f:
+            text = f.read()
+    else:
+        text = listing_page(rows=args.rows)
+
+    # the client used to parse the first page four more times for links, folders and refresh
+    def legacy_first_page():
+        for _ in range(4):
+            BeautifulSoup(text, features="html.parser")
+        legacy_extract_mails(text)
+
+    baseline = measure(lambda: legacy_extract_mails(text), args.repeat)
+    baseline_first = measure(legacy_first_page, args.repeat)
+    rows = len(legacy_extract_mails(text))
+    print(f"listing page: {len(text) / 1024:.0f} KiB, {rows} rows")
+    print(f"{'variant':<38}{'time':>10}{'speedup':>10}")
+    print(f"{'legacy listing (html.parser)':<38}{baseline * 1000:>8.1f}ms{1:>9.1f}x")
+    for backend in available_parsers():
+        t = measure(lambda: extract_mails(MailPage(text, backend)), args.repeat)
+        print(f"{'listing, strained (' + backend + ')':<38}{t * 1000:>8.1f}ms{baseline / t:>9.1f}x")
+
+    print(f"{'legacy first page (html.parser)':<38}{baseline_first * 1000:>8.1f}ms{1:>9.1f}x")
+    for backend in available_parsers():
+        def first_page():
+            page = MailPage(text, backend)
+            page.soup.find("p", {"class": "pages"})
+            page.soup.find("select", {"name": "select_folder"})
+            extract_mails(page)
+        t = measure(first_page, args.repeat)
+        print(f"{'first page, parsed once (' + backend + ')':<38}{t * 1000:>8.1f}ms{baseline_first / t:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
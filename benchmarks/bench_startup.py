@@ -0,0 +1,95 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lernsax.mail import Mail  # noqa: E402
+from lernsax.store import MailStore  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# modules the commands below must not load, they are what makes a cold start slow
+HEAVY_MODULES = ("requests", "urllib3", "bs4", "tqdm", "webdav3", "aiohttp")
+
+
+# every command runs in a fresh interpreter, as it would from cron. budgets are in milliseconds on top
+# of a bare interpreter start, so they hold on slow and fast machines alike
+def commands(data_dir: str) -> list[tuple[str, list[str], float]]:
+    return [
+        ("help", ["--help"], 50),
+        ("version", ["--version"], 50),
+        ("bad arguments", ["mail", "sync", "--workers", "x"], 50),
+        ("mail search", ["--email", "bench@example.lernsax.de", "--data-dir", data_dir, "mail", "search", "klausur"], 100),
+    ]
+
+
+def run(args: list[str]) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, *args], cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def median_ms(args: list[str], rounds: int) -> float:
+    return statistics.median(run(args) for _ in range(rounds)) * 1000
+
+
+def loaded_heavy_modules(args: list[str]) -> list[str]:
+    r = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT, capture_output=True, text=True)
+    loaded = {line.rsplit("|", 1)[-1].strip() for line in r.stderr.splitlines() if line.startswith("import time:")}
+    return sorted(module for module in loaded if module.split(".")[0] in HEAVY_MODULES and "." not in module)
+
+
+def build_store(data_dir: str, mails: int = 1000):
+    os.makedirs(f"{data_dir}/bench/mail", exist_ok=True)
+    store = MailStore(f"{data_dir}/bench/mail/mails.sqlite")
+    mails = [
+        Mail(
+            number=number,
+            subject=f"Klausur {number}" if number % 10 == 0 else f"Hausaufgabe {number}",
+            author_name="Anna Schmidt",
+            author_address="anna.schmidt@example.lernsax.de",
+            date="14.11.2023 22:13",
+            flags=1,
+            content="<p>Bitte bis Freitag abgeben.</p>",
+        ) for number in range(1, mails + 1)
+    ]
+    store.upsert("inbox", mails)
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start times of the lernsax cli against their budgets")
+    parser.add_argument("--rounds", type=int, default=15)
+    parser.add_argument("--output", help="write the results as json")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        build_store(data_dir)
+        baseline = median_ms(["-c", "pass"], args.rounds)
+        results, ok = {"interpreter_ms": round(baseline, 1), "commands": []}, True
+        print(f"{'bare interpreter':20} {baseline:7.1f} ms")
+        for name, command, budget in commands(data_dir):
+            command = ["-m", "lernsax", *command]
+            overhead = median_ms(command, args.rounds) - baseline
+            heavy = loaded_heavy_modules(command)
+            passed = overhead <= budget and not heavy
+            ok = ok and passed
+            results["commands"].append({
+                "name": name, "overhead_ms": round(overhead, 1), "budget_ms": budget, "heavy_modules": heavy, "ok": passed,
+            })
+            print(f"{name:20} {overhead:+7.1f} ms  budget {budget:5.0f} ms  {'ok' if passed else 'OVER'}"
+                  + (f"  loads {', '.join(heavy)}" if heavy else ""))
+
+    if args.output:
+        with open(args.output, "w+") as f:
+            json.dump(results, f, indent=4)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
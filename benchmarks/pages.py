@@ -0,0 +1,171 @@
+import random
+from urllib.parse import quote
+
+# synthetic LernSax pages, shaped after the markup the clients extract from
+
+NAMES = ["Anna Schmidt", "Ben Müller", "Clara Fischer", "David Weber", "Emma Wagner", "Felix Becker"]
+
+
+def navigation_noise(n: int = 300) -> str:
+    # the real pages carry a large menu and a lot of markup around the listing
+    items = "".join(
+        f'<li id="menu_{100000 + i}"><a href="/wws/{100000 + i}.php?sid=1" class="nav">Entry {i}</a>'
+        f'<div class="tooltip"><span>Description {i}</span></div></li>'
+        for i in range(n)
+    )
+    return f'<div id="menu"><ul>{items}</ul></div>'
+
+
+def listing_row(number: int, rng: random.Random) -> str:
+    name = rng.choice(NAMES)
+    address = name.lower().replace(" ", ".") + "@example.lernsax.de"
+    return (
+        "<tr>"
+        f'<td class="c_cb"><input type="checkbox" name="c_cb[{number}]" value="1"></td>'
+        f'<td class="c_env"><img src="../pics/mail_{rng.randrange(8)}.svg" alt=""></td>'
+        f'<td class="c_subj"><a href="#" data-popup="105592.php?sid=1&amp;mail_id={number}">Subject of mail {number}</a></td>'
+        f'<td class="c_from"><span title="{address}">{name}</span></td>'
+        f'<td class="c_size">{rng.randrange(1, 900)} KB</td>'
+        f'<td class="c_date">2023-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} {rng.randrange(24):02d}:{rng.randrange(60):02d}</td>'
+        "</tr>"
+    )
+
+
+# rows are numbered from first_number on, counting down with step=-1 for a newest-first listing.
+# the refresh and page links stay in the opened folder, like on LernSax
+def listing_page(
+    rows: int = 100, first_number: int = 1, pages: int = 1, seed: int = None, step: int = 1, folder: str = None
+) -> str:
+    rng = random.Random(first_number if seed is None else seed)
+    body = "".join(listing_row(first_number + i * step, rng) for i in range(rows))
+    in_folder = f"&amp;folder={folder}" if folder else ""
+    page_links = "".join(f'<a href="/wws/105592.php?sid=1{in_folder}&amp;page={p}">{p + 1}</a> ' for p in range(1, pages))
+    folders = "".join(
+        f'<option id="option_{folder}" value="/wws/105592.php?sid=1&amp;folder={folder}">{folder.title()}</option>'
+        for folder in ["inbox", "sent", "drafts", "trash"]
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>Mail service</title></head><body>"
+        + navigation_noise()
+        + f'<a class="q_105592_1025 block_link_intent_refresh" href="/wws/105592.php?sid=1{in_folder}&amp;refresh=1">Refresh</a>'
+        + '<a class="q_105592_1026" href="#" data-popup="105592.php?sid=1&amp;compose=1">Write e-mail</a>'
+        + f'<select name="select_folder">{folders}</select>'
+        + f'<div class="jail_table"><table class="table_list"><thead><tr><th>Subject</th></tr></thead><tbody>{body}</tbody></table></div>'
+        + f'<p class="pages">{page_links}</p>'
+        + "</body></html>"
+    )
+
+
+def site_page() -> str:
+    return "<html><head><script>top.location.replace('/wws/1.php');</script></head><body></body></html>"
+
+
+def login_page() -> str:
+    return (
+        "<html><body>"
+        '<a href="100001.php?login=1">Login</a>'
+        '<form method="post"><input name="login_login"><input name="login_password" type="password"></form>'
+        "</body></html>"
+    )
+
+
+def login_failed_page() -> str:
+    return "<html><body><script>msgbox('The login data could not be found in the database.');</script></body></html>"
+
+
+def start_page(groups: int = 5, classes: int = 2) -> str:
+    group_options = "".join(
+        f'<option class="top_option" value="{200000 + i}.php?sid=1&amp;group={i}">Group {i}</option>' for i in range(groups)
+    )
+    class_options = "".join(
+        f'<option class="top_option" value="{300000 + i}.php?sid=1&amp;class={i}">Class {i}</option>' for i in range(classes)
+    )
+    return (
+        "<!DOCTYPE html><html><head><title>LernSax</title></head><body>"
+        + navigation_noise()
+        + f'<select id="top_select_18"><option class="top_option" value="">Groups</option>{group_options}'
+        + '<option value="200999.php?sid=1&amp;join=1">Join a group</option></select>'
+        + f'<select id="top_select_19"><option class="top_option" value="">Classes</option>{class_options}</select>'
+        + '<select name="language"><option value="de">Deutsch</option><option value="en">English</option></select>'
+        + '<a href="105592.php?sid=1">Mail service</a>'
+        + "</body></html>"
+    )
+
+
+def group_page(group: int) -> str:
+    return (
+        "<!DOCTYPE html><html><head><title>Group</title></head><body>"
+        + navigation_noise()
+        + f'<ul><li id="menu_125520"><a href="400000.php?sid=1&amp;group={group}&amp;folder=%2F">Files</a></li></ul>'
+        + "</body></html>"
+    )
+
+
+# file storage listing: the opened folder, a link back to the parent (or the folder itself at the top),
+# then sub folders and files, like LernSax lists them
+def storage_page(group: int, folder: str, subfolders: list[str], files: list[tuple[str, int]], download_url: str) -> str:
+    def folder_url(path: str) -> str:
+        return f"/wws/400000.php?sid=1&amp;group={group}&amp;folder={quote(path, safe='')}"
+
+    parent = folder.rstrip("/").rsplit("/", 1)[0] + "/"
+    rows = [
+        f'<tr class="files_item_folder_open"><td class="c_name"><a href="{folder_url(folder)}">{folder}</a></td></tr>',
+        f'<tr class="files_item_folder"><td class="c_name"><a href="{folder_url(parent)}">..</a></td></tr>',
+    ]
+    for path in subfolders:
+        name = path.rstrip("/").rsplit("/", 1)[-1]
+        rows.append(f'<tr class="files_item_folder"><td class="c_name"><a href="{folder_url(path)}">{name}</a></td></tr>')
+    for path, size in files:
+        name = path.rsplit("/", 1)[-1]
+        url = f"{download_url}?path={quote(f'{group}/groups{path}', safe='')}"
+        rows.append(
+            f'<tr class="files_item_file" data-drag_downloadurl="text/plain:{name}:{url}">'
+            f'<td class="c_name"><a href="/wws/400001.php?sid=1&amp;file={quote(path, safe="")}">{name}</a></td></tr>'
+        )
+    return (
+        "<!DOCTYPE html><html><head><title>Files</title></head><body>"
+        + navigation_noise(50)
+        + f'<table class="table_list space sort_skip_first">{"".join(rows)}</table>'
+        + "</body></html>"
+    )
+
+
+def mail_page(number: int, attachments: list[str] = None, download_url: str = "https://d.lernsax.de/download.php") -> str:
+    attachments = attachments or []
+    attachment_row = ""
+    if attachments:
+        links = "".join(f'<div><a href="{download_url}?path={path}">{path.rsplit("/", 1)[-1]}</a></div>' for path in attachments)
+        attachment_row = f'<tr><td class="label">Attachments</td><td class="data">{links}<div><a href="#">all</a></div></td></tr>'
+    paragraphs = "<br/>".join(f"Line {i} of the body of mail {number}." for i in range(40))
+    return (
+        "<!DOCTYPE html><html><body>"
+        + navigation_noise(50)
+        + '<table class="table_lr">'
+        + '<tr><td class="label">From</td><td class="data"><span title="sender@example.lernsax.de">Sender</span></td></tr>'
+        + '<tr><td class="label">Date</td><td class="data">2023-01-02 10:00</td></tr>'
+        + '<tr><td class="label">To</td><td class="data"><span title="me@example.lernsax.de">Me</span></td></tr>'
+        + f'<tr><td class="label">Subject</td><td class="data">Subject of mail {number}</td></tr>'
+        + attachment_row
+        + f'<tr><td class="label">Source</td><td class="data"><a href="105592.php?sid=1&amp;eml={number}">eml</a></td></tr>'
+        + "</table>"
+        + f'<p class="panel">{paragraphs}</p>'
+        + "</body></html>"
+    )
+
+
+# raw message behind the eml link, with a body line that an mbox writer has to quote
+def eml_message(number: int) -> str:
+    return (
+        f"From: Anna Schmidt <anna.schmidt@example.lernsax.de>\r\n"
+        f"To: bench@example.lernsax.de\r\n"
+        f"Subject: Subject of mail {number}\r\n"
+        f"Date: Mon, 02 Jan 2023 10:00:00 +0100\r\n"
+        f"Message-ID: <{number}@example.lernsax.de>\r\n"
+        "\r\n"
+        f"Body of mail {number}.\r\n"
+        "From here on the line has to be quoted in mbox files.\r\n"
+    )
+
+
+def compose_page() -> str:
+    return "<html><body><script>var refresh_url='/wws/105592.php?sid=1&send=1';</script></body></html>"
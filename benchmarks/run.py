@@ -0,0 +1,145 @@
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lernsax.auth import LoginClient  # noqa: E402
+from lernsax.mail import WebMailClient  # noqa: E402
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def client_options(url: str) -> dict:
+    return {"base_url": url, "download_url": url + "/download.php", "webdav_url": url + "/webdav.php"}
+
+
+# the stand-in runs in its own process, so its html generation does not compete with the clients for the GIL
+def start_server(args) -> tuple[subprocess.Popen, str]:
+    process = subprocess.Popen(
+        [
+            sys.executable, SERVER,
+            "--port", "0",
+            "--mailbox", str(args.mailbox),
+            "--page-size", str(args.page_size),
+            "--latency", str(args.latency),
+            "--attachment-size", str(args.attachment_size),
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    url = process.stdout.readline().split()[-1]
+    return process, url
+
+
+def login(url: str) -> LoginClient:
+    client = LoginClient("bench@example.lernsax.de", "secret", **client_options(url))
+    client.login()
+    return client
+
+
+def bench_login(url: str, rounds: int) -> dict:
+    durations = [timed(lambda: login(url))[0] for _ in range(rounds)]
+    return {"rounds": rounds, "mean_s": sum(durations) / rounds, "min_s": min(durations)}
+
+
+def bench_mail(url: str, workers: int) -> dict:
+    client = WebMailClient(login(url))
+    client.get_mail_link()
+
+    # the first listing page is fetched by get_initial_page, the throughput covers the remaining ones
+    client.get_initial_page()
+    listing_time, _ = timed(client.get_all_mail_pages)
+    parse_time, _ = timed(client.parse_all_mail_pages)
+    body_time, _ = timed(lambda: client.parse_all_mails(workers=workers))
+    attachment_time, _ = timed(lambda: client.download_attachments(workers=workers))
+
+    mails = len(client.mails)
+    pages = len(client.mail_pages)
+    attachments = sum(len(mail.attachments) for mail in client.mails)
+    return {
+        "mails": mails,
+        "pages": pages,
+        "listing_pages_per_s": (pages - 1) / listing_time if pages > 1 else None,
+        "parse_mails_per_s": mails / parse_time,
+        "body_mails_per_s": mails / body_time,
+        "attachments": attachments,
+        "attachments_per_s": attachments / attachment_time if attachments else None,
+        "failed_mails": len(client.failed_mails),
+    }
+
+
+# tracemalloc slows allocations down a lot, so memory is measured in a separate run
+def bench_memory(url: str, workers: int) -> dict:
+    client = WebMailClient(login(url))
+    client.get_mail_link()
+    tracemalloc.start()
+    client.get_initial_page()
+    client.get_all_mail_pages()
+    client.parse_all_mail_pages()
+    client.parse_all_mails(workers=workers)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_mib": peak / 1024 ** 2}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the clients against a local LernSax stand-in")
+    parser.add_argument("--mailbox", type=int, default=500, help="mails per folder")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every request")
+    parser.add_argument("--attachment-size", type=int, default=64 * 1024)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--login-rounds", type=int, default=5)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+    logging.basicConfig(level="WARNING")
+
+    output = os.path.abspath(args.json) if args.json else None
+    # the clients create data/<user> relative to the working directory
+    os.chdir(tempfile.mkdtemp(prefix="lernsax-bench-"))
+    process, url = start_server(args)
+    try:
+        results = {
+            "config": {
+                "mailbox": args.mailbox,
+                "page_size": args.page_size,
+                "latency_s": args.latency,
+                "attachment_size": args.attachment_size,
+                "workers": args.workers,
+            },
+            "login": bench_login(url, args.login_rounds),
+            "mail": bench_mail(url, args.workers),
+            "memory": bench_memory(url, args.workers),
+            "requests": requests.get(url + "/_stats").json()["requests"],
+        }
+    finally:
+        process.terminate()
+        process.wait()
+
+    for section in ("login", "mail", "memory"):
+        for key, value in results[section].items():
+            value = f"{value:.3f}" if isinstance(value, float) else value
+            print(f"{section + '.' + key:<32}{value:>12}")
+    print(f"{'requests':<32}{results['requests']:>12}")
+    if output:
+        with open(output, "w+") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+import argparse
+import hashlib
+import json
+import math
+import re
+import socket
+import threading
+import time
+from email.parser import BytesParser
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, quote, unquote
+
+import pages
+
+
+# local stand-in for www.lernsax.de, d.lernsax.de and the WebDAV share, serving synthetic pages
+# with the markup the clients depend on. Every folder holds the same mailbox of mailbox_size mails.
+class StandInServer:
+    def __init__(
+        self,
+        mailbox_size: int = 200,
+        page_size: int = 50,
+        latency: float = 0.0,
+        attachment_size: int = 64 * 1024,
+        attachments_every: int = 10,
+        webdav_depth: int = 2,
+        webdav_width: int = 3,
+        webdav_files: int = 5,
+        storage_depth: int = 2,
+        storage_width: int = 2,
+        storage_files: int = 3,
+        newest_first: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        # mails can be added while the server runs, a newest-first listing shows them on the first page
+        self.mailbox_size = mailbox_size
+        self.newest_first = newest_first
+        self.page_size = page_size
+        self.latency = latency
+        self.attachment_size = attachment_size
+        self.attachments_every = attachments_every
+        self.webdav = build_webdav_tree(webdav_depth, webdav_width, webdav_files)
+        # every group and class has this file storage
+        self.storage = build_webdav_tree(storage_depth, storage_width, storage_files)
+        self.requests = 0
+        # compose forms handed out and messages received, as (to, subject, [(file name, size)])
+        self.compose_forms = 0
+        self.sent = []
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), StandInHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.standin = self
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # keyword arguments pointing a LoginClient at this server
+    @property
+    def client_options(self) -> dict:
+        return {
+            "base_url": self.url,
+            "download_url": self.url + "/download.php",
+            "webdav_url": self.url + "/webdav.php",
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def page_count(self) -> int:
+        return max(1, math.ceil(self.mailbox_size / self.page_size))
+
+    def attachments(self, number: int) -> list[str]:
+        if not self.attachments_every or number % self.attachments_every:
+            return []
+        return [f"{number * 7919 % 100000}/mail/{number}/attachment_{number}.bin"]
+
+
+def attachment_body(path: str, size: int) -> bytes:
+    seed = hashlib.sha256(path.encode()).digest()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+def webdav_etag(dav_path: str, size: int) -> str:
+    return '"' + hashlib.md5(f"{dav_path}:{size}".encode()).hexdigest() + '"'
+
+
+def build_webdav_tree(depth: int, width: int, files: int) -> dict:
+    # path -> size, None for collections
+    tree = {"/": None}
+    level = ["/"]
+    for _ in range(depth):
+        next_level = []
+        for folder in level:
+            for f in range(files):
+                tree[f"{folder}file_{f}.txt"] = 1024 * (f + 1)
+            for d in range(width):
+                path = f"{folder}dir_{d}/"
+                tree[path] = None
+                next_level.append(path)
+        level = next_level
+    for folder in level:
+        for f in range(files):
+            tree[f"{folder}file_{f}.txt"] = 1024 * (f + 1)
+    return tree
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def standin(self) -> StandInServer:
+        return self.server.standin
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes, without this keep-alive requests stall on delayed acks
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body, status: int = 200, content_type: str = "text/html; charset=utf-8", headers: dict = None):
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def begin(self):
+        self.standin.count_request()
+        if self.standin.latency:
+            time.sleep(self.standin.latency)
+        url = urlparse(self.path)
+        return url.path, {key: values[0] for key, values in parse_qs(url.query).items()}
+
+    def read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length", 0))
+        return self.rfile.read(length) if length else b""
+
+    def logged_in(self) -> bool:
+        return "sid=standin" in self.headers.get("Cookie", "")
+
+    def do_GET(self):
+        path, query = self.begin()
+        if path == "/":
+            return self.reply(pages.site_page())
+        if path == "/wws/1.php":
+            return self.reply("", status=302, headers={"Location": "/wws/9.php#2.php?sid=1"})
+        if path == "/wws/2.php":
+            return self.reply(pages.login_page())
+        if path == "/wws/100001.php":
+            return self.reply(pages.start_page() if self.logged_in() else pages.login_page())
+        if path == "/wws/105592.php":
+            return self.mail_service(query)
+        if re.fullmatch(r"/wws/[23]\d{5}\.php", path):
+            return self.reply(pages.group_page(int(query.get("group", query.get("class", 0)))))
+        if path == "/wws/400000.php":
+            return self.file_storage(int(query.get("group", 0)), query.get("folder", "/"))
+        if path == "/download.php":
+            return self.download(query.get("path", ""))
+        if path.startswith("/webdav.php"):
+            return self.webdav_get(path)
+        if path == "/_stats":
+            return self.reply(json.dumps({"requests": self.standin.requests}), content_type="application/json")
+        self.reply("not found", status=404)
+
+    def do_POST(self):
+        path, query = self.begin()
+        body = self.read_body()
+        if path == "/wws/100001.php":
+            if b"login_password=wrong" in body:
+                return self.reply(pages.login_failed_page())
+            return self.reply(pages.start_page(), headers={"Set-Cookie": "sid=standin; Path=/"})
+        if path == "/wws/105592.php" and "send" in query:
+            self.record_sent(body)
+            return self.reply("<html><body>sent</body></html>")
+        self.reply("not found", status=404)
+
+    def do_PROPFIND(self):
+        path, _ = self.begin()
+        self.read_body()
+        self.webdav_propfind(path)
+
+    def do_MKCOL(self):
+        path, _ = self.begin()
+        dav_path = self.dav_path(path).rstrip("/") + "/"
+        if dav_path in self.standin.webdav:
+            return self.reply("exists", status=405)
+        if dav_path.rstrip("/").rsplit("/", 1)[0] + "/" not in self.standin.webdav:
+            return self.reply("parent missing", status=409)
+        self.standin.webdav[dav_path] = None
+        self.reply("", status=201)
+
+    # uploads are only counted, not kept, so large trees do not end up in memory
+    def do_PUT(self):
+        path, _ = self.begin()
+        dav_path = self.dav_path(path)
+        if dav_path.rsplit("/", 1)[0] + "/" not in self.standin.webdav:
+            return self.reply("parent missing", status=409)
+        remaining, size = int(self.headers.get("Content-Length", 0)), 0
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 256 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            size += len(chunk)
+        self.standin.webdav[dav_path] = size
+        self.reply("", status=201, headers={"ETag": webdav_etag(dav_path, size)})
+
+    # MAIL SERVICE
+    def mail_service(self, query: dict):
+        if not self.logged_in():
+            return self.reply(pages.login_page())
+        if "mail_id" in query:
+            number = int(query["mail_id"])
+            return self.reply(pages.mail_page(number, self.standin.attachments(number), self.standin.url + "/download.php"))
+        if "compose" in query:
+            with self.standin._lock:
+                self.standin.compose_forms += 1
+            return self.reply(pages.compose_page())
+        if "eml" in query:
+            return self.reply(pages.eml_message(int(query["eml"])), content_type="message/rfc822")
+        page = int(query.get("page", 0))
+        first = page * self.standin.page_size + 1
+        rows = max(0, min(self.standin.page_size, self.standin.mailbox_size - first + 1))
+        if self.standin.newest_first:
+            first = self.standin.mailbox_size - page * self.standin.page_size
+        self.reply(pages.listing_page(
+            rows=rows, first_number=first, pages=self.standin.page_count(), step=-1 if self.standin.newest_first else 1,
+            folder=query.get("folder"),
+        ))
+
+    def record_sent(self, body: bytes):
+        message = BytesParser().parsebytes(f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode() + body)
+        fields, files = {}, []
+        for part in message.get_payload() if message.is_multipart() else []:
+            if part.get_filename():
+                files.append((part.get_filename(), len(part.get_payload(decode=True))))
+            elif part.get_filename() is None:
+                fields[part.get_param("name", header="content-disposition")] = part.get_payload(decode=True).decode()
+        with self.standin._lock:
+            self.standin.sent.append((fields.get("to"), fields.get("subject"), files))
+
+    def file_storage(self, group: int, folder: str):
+        if self.standin.storage.get(folder, 0) is not None:
+            return self.reply("not found", status=404)
+        children = [
+            path for path in self.standin.storage
+            if path != folder and path.startswith(folder) and "/" not in path[len(folder):].rstrip("/")
+        ]
+        subfolders = [path for path in children if path.endswith("/")]
+        files = [(path, self.standin.storage[path]) for path in children if not path.endswith("/")]
+        self.reply(pages.storage_page(group, folder, subfolders, files, self.standin.url + "/download.php"))
+
+    def download(self, path: str):
+        body = attachment_body(path, self.standin.attachment_size)
+        range_header = self.headers.get("Range")
+        if not range_header:
+            return self.reply(body, content_type="application/octet-stream")
+        start = int(range_header.split("=")[1].split("-")[0])
+        if start >= len(body):
+            return self.reply(b"", status=416)
+        self.reply(
+            body[start:],
+            status=206,
+            content_type="application/octet-stream",
+            headers={"Content-Range": f"bytes {start}-{len(body) - 1}/{len(body)}"},
+        )
+
+    # WEBDAV
+    def dav_path(self, path: str) -> str:
+        path = unquote(path[len("/webdav.php"):]) or "/"
+        return path if path.startswith("/") else "/" + path
+
+    def webdav_get(self, path: str):
+        dav_path = self.dav_path(path)
+        size = self.standin.webdav.get(dav_path)
+        if size is None:
+            return self.reply("not found", status=404)
+        self.reply(attachment_body(dav_path, size), content_type="application/octet-stream")
+
+    def webdav_propfind(self, path: str):
+        dav_path = self.dav_path(path)
+        if dav_path not in self.standin.webdav and dav_path + "/" in self.standin.webdav:
+            dav_path += "/"
+        if dav_path not in self.standin.webdav:
+            return self.reply("not found", status=404)
+        depth = self.headers.get("Depth", "1")
+        entries = [dav_path]
+        if dav_path.endswith("/") and depth != "0":
+            for candidate in self.standin.webdav:
+                if candidate == dav_path or not candidate.startswith(dav_path):
+                    continue
+                rest = candidate[len(dav_path):].rstrip("/")
+                if depth == "infinity" or "/" not in rest:
+                    entries.append(candidate)
+        responses = "".join(self.propfind_entry(entry) for entry in entries)
+        self.reply(
+            f'<?xml version="1.0" encoding="utf-8"?><d:multistatus xmlns:d="DAV:">{responses}</d:multistatus>',
+            status=207,
+            content_type="application/xml; charset=utf-8",
+        )
+
+    def propfind_entry(self, dav_path: str) -> str:
+        size = self.standin.webdav[dav_path]
+        name = dav_path.rstrip("/").rsplit("/", 1)[-1]
+        etag = webdav_etag(dav_path, size)
+        resource_type = "<d:collection/>" if size is None else ""
+        length = "" if size is None else f"<d:getcontentlength>{size}</d:getcontentlength>"
+        return (
+            f"<d:response><d:href>/webdav.php{quote(dav_path)}</d:href><d:propstat><d:prop>"
+            f"<d:displayname>{name}</d:displayname><d:resourcetype>{resource_type}</d:resourcetype>{length}"
+            f'<d:getetag>{etag}</d:getetag><d:getlastmodified>{formatdate(1672653600, usegmt=True)}</d:getlastmodified>'
+            "</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a local LernSax stand-in")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--mailbox", type=int, default=200, help="mails per folder")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--attachment-size", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    server = StandInServer(
+        mailbox_size=args.mailbox,
+        page_size=args.page_size,
+        latency=args.latency,
+        attachment_size=args.attachment_size,
+        port=args.port,
+    )
+    print(f"serving on {server.url}", flush=True)
+    server.httpd.serve_forever()
@@ -0,0 +1,30 @@
+__version__ = "0.1.0"
+
+# the clients are importable from the package, but only loaded on first access, so importing
+# lernsax (and starting the cli) does not pay for requests, bs4 and webdav3 up front
+_EXPORTS = {
+    "LoginClient": "auth",
+    "SessionCache": "auth",
+    "WebMailClient": "mail",
+    "OutgoingMail": "mail",
+    "MailStore": "store",
+    "WebDAVClient": "webdav",
+    "GroupClient": "group",
+    "Orchestrator": "orchestrator",
+    "MailWatcher": "watch",
+    # need the async extra
+    "AsyncLoginClient": "aio",
+    "AsyncWebMailClient": "aio",
+}
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+
+    return getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_EXPORTS))
@@ -0,0 +1,400 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+import aiohttp
+
+from .auth import (
+    BASE_URL,
+    DATA_DIR,
+    DOWNLOAD_URL,
+    MissingUserInfoError,
+    NavigationIndex,
+    load_creds,
+    extract_redirect_url,
+    extract_login_page_url,
+    extract_iframe_link,
+    build_login_payload,
+    check_login,
+)
+from .mail import (
+    Mail,
+    MailPage,
+    as_page,
+    MailLinkNotFoundError,
+    extract_refresh_link,
+    extract_other_mail_pages,
+    extract_mails,
+    extract_mail_info,
+    extract_mail_folders,
+    extract_compose_link,
+    extract_send_link,
+    build_send_payload,
+    attachment_storage_path,
+)
+from .download import DownloadManifest, part_size, update_checksum
+from .metrics import Metrics, REGISTRY, endpoint_category
+from .store import MailStore
+
+
+# the body of an aiohttp response is gone once its context exits, so the text is kept on this object
+class AsyncResponse:
+    def __init__(self, url: str, status: int, headers: dict, text: str):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.text = text
+
+    def __repr__(self):
+        return f"<AsyncResponse [{self.status}] {self.url}>"
+
+
+class AsyncLoginClient:
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        concurrency: int = 10,
+        pool_size: int = 20,
+        base_url: str = BASE_URL,
+        download_url: str = DOWNLOAD_URL,
+        metrics: Metrics = None,
+        data_dir: str = DATA_DIR,
+    ):
+        self.logged_in_page: AsyncResponse = None
+        self._navigation: NavigationIndex = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+        if not email or not password:
+            raise MissingUserInfoError("User not valid or found")
+        self.session: aiohttp.ClientSession = None
+        self.pool_size = pool_size
+        self.metrics = metrics or REGISTRY
+        # limits the requests in flight for this client, independent of the connection pool
+        self.concurrency = concurrency
+        self._semaphore: asyncio.Semaphore = None
+        # path -> transfer in progress, concurrent downloads of the same file share it
+        self._downloads: dict[str, asyncio.Task] = {}
+
+        self.email = email
+        self.password = password
+        self.base_url = base_url
+        self.download_url = download_url
+
+        # only created by the clients that write into it
+        self.downloads_folder = f"{data_dir}/{self.email.split('@')[0]}"
+
+    @classmethod
+    def from_creds(cls, identifier, creds_file: str = "creds.json", **kwargs):
+        user = load_creds(identifier, creds_file)
+        return cls(user.get("username", ""), user.get("password", ""), **kwargs)
+
+    # SESSION HANDLING
+    async def open(self):
+        if self.session is None or self.session.closed:
+            # created here and not in __init__, where no loop runs yet: before python 3.10 a semaphore binds
+            # to the loop current at its creation
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.pool_size)
+            # unsafe allows cookies for ip addresses, e.g. a local stand-in server
+            self.session = aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.CookieJar(unsafe=True))
+        return self
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    @property
+    def logged_in_page(self) -> AsyncResponse:
+        return self._logged_in_page
+
+    @logged_in_page.setter
+    def logged_in_page(self, r: AsyncResponse):
+        self._logged_in_page = r
+        self._navigation = None
+
+    # login is a coroutine, so unlike LoginClient.navigation this can not log in on demand
+    @property
+    def navigation(self) -> NavigationIndex:
+        if self._navigation is None:
+            self._navigation = NavigationIndex.from_page(self.logged_in_page.text, self.base_url)
+        return self._navigation
+
+    async def request(self, method: str, url: str, **kwargs) -> AsyncResponse:
+        await self.open()
+        async with self._semaphore:
+            start = time.perf_counter()
+            async with self.session.request(method, url, **kwargs) as r:
+                body = await r.read()
+                text = await r.text()
+            category = endpoint_category(str(r.url))
+            self.metrics.inc("lernsax_requests_total", category=category, status=r.status)
+            self.metrics.observe("lernsax_request_seconds", time.perf_counter() - start, category=category)
+            self.metrics.inc("lernsax_response_bytes_total", len(body), category=category)
+            return AsyncResponse(str(r.url), r.status, dict(r.headers), text)
+
+    async def get(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> AsyncResponse:
+        return await self.request("POST", url, **kwargs)
+
+    # Downloader.download for the event loop: returns False if the manifest has the file as complete,
+    # continues .part files with a range request and records size and sha256 in the manifest.
+    # the file io runs in worker threads
+    async def download(
+        self, url: str, path: str, manifest: DownloadManifest = None, meta: dict = None, chunk_size: int = 64 * 1024
+    ) -> bool:
+        task = self._downloads.get(path)
+        if task is None:
+            task = asyncio.ensure_future(self._download(url, path, manifest, meta or {}, chunk_size))
+            self._downloads[path] = task
+            task.add_done_callback(lambda _: self._downloads.pop(path, None))
+        return await task
+
+    async def _download(self, url: str, path: str, manifest: DownloadManifest, meta: dict, chunk_size: int) -> bool:
+        if manifest is not None and await asyncio.to_thread(manifest.is_complete, path, chunk_size):
+            return False
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+
+        part = path + ".part"
+        offset = await asyncio.to_thread(part_size, part)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        if offset and meta.get("etag"):
+            headers["If-Range"] = meta["etag"]
+        sha = hashlib.sha256()
+        await self.open()
+        async with self._semaphore:
+            async with self.session.get(url, headers=headers) as r:
+                # 416 on a resume means the part file already holds the whole body
+                part_complete = offset and r.status == 416
+                if not part_complete:
+                    r.raise_for_status()
+                    if offset and r.status != 206:
+                        self._logger.info(f" * server ignored range request for {url!r}, restarting")
+                        offset = 0
+                if offset:
+                    await asyncio.to_thread(update_checksum, sha, part, chunk_size)
+                if not part_complete:
+                    f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+
+                    def write(chunk: bytes):
+                        f.write(chunk)
+                        sha.update(chunk)
+
+                    try:
+                        async for chunk in r.content.iter_chunked(chunk_size):
+                            await asyncio.to_thread(write, chunk)
+                    finally:
+                        await asyncio.to_thread(f.close)
+
+        await asyncio.to_thread(os.replace, part, path)
+        if manifest is not None:
+            stat = await asyncio.to_thread(os.stat, path)
+            manifest.set(path, stat.st_size, sha.hexdigest(), local_mtime=stat.st_mtime_ns, **meta)
+        return True
+
+    # LOGIN CHAIN
+    async def get_site_visit_redirect_url(self):
+        self._logger.info(f" -> Visiting {self.base_url}/ and retrieving redirect url...")
+
+        r = await self.get(self.base_url)
+        return extract_redirect_url(r.text, self.base_url)
+
+    async def resolve_php_redirect(self, url: str) -> str:
+        self._logger.info(f" -> Resolving redirect url {url!r}...")
+
+        r = await self.get(url, allow_redirects=False)
+        return extract_login_page_url(r.headers["Location"], self.base_url)
+
+    async def get_iframe_link(self, url: str) -> str:
+        self._logger.info(f" -> Getting link of iframe...")
+
+        r = await self.get(url)
+        return extract_iframe_link(r.text, self.base_url)
+
+    async def perform_login(self, login_url: str) -> AsyncResponse:
+        self._logger.info(" -> Performing login...")
+
+        payload = build_login_payload(self.email, self.password)
+        r = await self.post(login_url, data=payload)
+        check_login(r.text)
+
+        self._logger.info(f" * Successfully logged in as {self.email!r}")
+
+        self.logged_in_page = r
+        return r
+
+    async def login(self) -> AsyncResponse:
+        self._logger.info(f" * Initializing session for {self.email!r}...")
+
+        redirect_url = await self.get_site_visit_redirect_url()
+        login_page_url = await self.resolve_php_redirect(redirect_url)
+        login_page_iframe_url = await self.get_iframe_link(login_page_url)
+        return await self.perform_login(login_page_iframe_url)
+
+
+class AsyncWebMailClient:
+    def __init__(self, auth_client: AsyncLoginClient, parser: str = "html.parser"):
+        self.auth_client: AsyncLoginClient = auth_client
+        self.parser = parser
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.initial_mail_link: str = ""
+        self.mail_links: list[str] = []
+        self.mail_pages: list[MailPage] = []
+        self.mails: list[Mail] = []
+        self.failed_mails: list[tuple[Mail, Exception]] = []
+        self.folders: dict = {}
+
+        self.folder = "inbox"
+        self.os_folder = f"{self.auth_client.downloads_folder}/mail/inbox"
+        self.attachments_folder = f"{self.os_folder}/attachments"
+        os.makedirs(self.attachments_folder, exist_ok=True)
+        self.store = MailStore(f"{self.auth_client.downloads_folder}/mail/mails.sqlite")
+        # the same manifest as WebMailClient, both clients agree on which attachments are complete
+        self.manifest = DownloadManifest(f"{self.attachments_folder}/.manifest.json")
+
+    # INITIALISING
+    def get_mail_link(self):
+        self._logger.info(" -> extracting link to mail page")
+
+        self.initial_mail_link = self.auth_client.navigation.mail_link
+        if not self.initial_mail_link:
+            raise MailLinkNotFoundError("The link to the mail overview can't be found.")
+
+    async def get_initial_page(self):
+        self._logger.info(" -> visiting mail page")
+
+        r = await self.auth_client.get(self.initial_mail_link)
+        self.mail_pages = [MailPage(r.text, self.parser)]
+        self.mails = []
+
+    def get_refresh_link(self):
+        self._logger.info(" -> extracting refresh link")
+
+        self.initial_mail_link = extract_refresh_link(self.mail_pages[0], self.auth_client.base_url)
+
+    async def refresh(self):
+        self._logger.info(" -> refreshing mail page")
+
+        self.get_refresh_link()
+        await self.get_initial_page()
+
+    # links to other mail pages in current folder
+    def find_other_mail_pages(self):
+        self._logger.info("-> extracting links to further mails")
+
+        self.mail_links = extract_other_mail_pages(self.mail_pages[0])
+        return self.mail_links
+
+    # crawl html of other mail pages, gather keeps them in page order
+    async def get_all_mail_pages(self):
+        self._logger.info(" -> visiting all mail pages")
+        await asyncio.to_thread(self.find_other_mail_pages)
+        pages = await asyncio.gather(*(
+            self.auth_client.get(self.auth_client.base_url + page[0]) for page in self.mail_links
+        ))
+        self.mail_pages.extend(MailPage(r.text, self.parser) for r in pages)
+        return self.mail_pages
+
+    async def get_mail(self, mail: Mail):
+        r = await self.auth_client.get(self.auth_client.base_url + "/wws/" + mail.read_link)
+        return r.text
+
+    # HTML PARSING
+    # BeautifulSoup and the store run in worker threads, so a parse never holds up the requests in flight
+    async def parse_all_mail_pages(self):
+        self._logger.info(" -> parsing all mail pages")
+
+        for page in self.mail_pages:
+            await asyncio.to_thread(self.parse_mail_page, page)
+
+    def parse_mail_page(self, mail_page_text):
+        self.mails.extend(extract_mails(as_page(mail_page_text, self.parser)))
+        return self.mails
+
+    async def parse_all_mails(self, mails: list[Mail] = None):
+        self._logger.info(" -> downloading all mails")
+
+        mails = self.mails if mails is None else mails
+        results = await asyncio.gather(*(self.parse_mail(mail) for mail in mails), return_exceptions=True)
+
+        self.failed_mails = [(mail, result) for mail, result in zip(mails, results) if isinstance(result, Exception)]
+        for mail, error in self.failed_mails:
+            self._logger.warning(f" * could not download {mail}: {error!r}")
+        return self.failed_mails
+
+    async def parse_mail(self, mail: Mail):
+        mail_txt = await self.get_mail(mail)
+        mail.add_info(**await asyncio.to_thread(extract_mail_info, mail_txt, self.parser))
+
+    # DOWNLOAD HANDLING
+    async def download_attachment(self, path: str) -> bool:
+        url = f"{self.auth_client.download_url}?path={path}"
+        return await self.auth_client.download(url, attachment_storage_path(self.attachments_folder, path), self.manifest)
+
+    async def dump_mails(self):
+        await asyncio.to_thread(self.store.upsert, self.folder, self.mails)
+        # forwarded mails share attachments, every file is only fetched once
+        attachments = {}
+        for mail in self.mails:
+            for attachment in mail.attachments:
+                attachments.setdefault(attachment_storage_path(self.attachments_folder, attachment), attachment)
+        try:
+            results = await asyncio.gather(
+                *(self.download_attachment(a) for a in attachments.values()), return_exceptions=True
+            )
+        finally:
+            await asyncio.to_thread(self.manifest.save)
+        for attachment, result in zip(attachments.values(), results):
+            if isinstance(result, Exception):
+                self._logger.warning(f" * could not download attachment {attachment!r}: {result!r}")
+
+    # SEND HANDLING
+    async def send_mail(self, receiver: list[str], cc: list[str] = None, bcc: list[str] = None, **kwargs):
+        cc = cc if cc else []
+        bcc = bcc if bcc else []
+        subject = kwargs.get("subject", f"Mail to {receiver}")
+        body = kwargs.get("body", f"Hello {receiver}")
+        await self.get_initial_page()
+        c = await self.auth_client.get(extract_compose_link(self.mail_pages[0], self.auth_client.base_url))
+        payload = build_send_payload(receiver, cc, bcc, subject, body)
+        return await self.auth_client.post(extract_send_link(c.text, self.auth_client.base_url), data=payload)
+
+    # FOLDER HANDLING
+    async def find_mail_folders(self):
+        self._logger.info(" -> finding mail folders")
+        await self.get_initial_page()
+        self.folders = await asyncio.to_thread(extract_mail_folders, self.mail_pages[0], self.auth_client.base_url)
+
+    async def switch_mail_folder(self, folder: str):
+        self._logger.info(f" -> switching to mail folder {folder!r}")
+
+        self.initial_mail_link = self.folders[folder]["url"]
+        await self.get_initial_page()
+
+        self.folder = folder
+        self.os_folder = f"{self.auth_client.downloads_folder}/mail/{folder}"
+        self.attachments_folder = f"{self.os_folder}/attachments"
+        await asyncio.to_thread(os.makedirs, self.attachments_folder, exist_ok=True)
+        self.manifest = await asyncio.to_thread(DownloadManifest, f"{self.attachments_folder}/.manifest.json")
+
+    # download EVERYTHING
+    async def download_everything(self):
+        self._logger.info(" -> downloading EVERYTHING")
+        self.get_mail_link()
+        await self.get_initial_page()
+        await self.find_mail_folders()
+        for cur_folder in self.folders:
+            self._logger.info(f" -> downloading folder {cur_folder}")
+            await self.switch_mail_folder(cur_folder)
+            await self.get_all_mail_pages()
+            await self.parse_all_mail_pages()
+            await self.parse_all_mails()
+            await self.dump_mails()
@@ -0,0 +1,359 @@
+import hashlib
+import json
+import requests
+from bs4 import BeautifulSoup
+import logging
+import re
+import os
+import threading
+from functools import lru_cache
+from urllib.parse import urljoin, urlparse, parse_qsl, urlencode
+from bs4 import SoupStrainer
+
+from .metrics import Metrics, REGISTRY, instrument_session
+from .transport import AdaptiveLimiter, HostRateLimiter, Transport
+
+
+BASE_URL = "https://www.lernsax.de"
+DOWNLOAD_URL = "https://d.lernsax.de/download.php"
+WEBDAV_URL = "https://www.lernsax.de/webdav.php"
+DATA_DIR = "data"
+
+
+class MissingUserInfoError(Exception):
+    ...
+
+
+class UnsuccessfulLoginError(Exception):
+    ...
+
+
+class NoIframeFoundError(Exception):
+    ...
+
+
+# creds.json is read once per process, however many accounts are created from it
+@lru_cache(maxsize=None)
+def load_all_creds(creds_file: str = "creds.json") -> dict:
+    with open(creds_file, "r") as f:
+        return json.load(f)
+
+
+def load_creds(identifier: str, creds_file: str = "creds.json") -> dict:
+    return load_all_creds(creds_file).get(identifier, {})
+
+
+# HTML EXTRACTION
+# pure functions on page html, shared by LoginClient and the async client in aio.py
+def extract_redirect_url(site_text: str, base_url: str = BASE_URL) -> str:
+    return (
+        base_url
+        + re.search(r"top\.location\.replace\('(?P<redirect_url>.*)'\)", site_text).group("redirect_url")
+    )
+
+
+def extract_login_page_url(location: str, base_url: str = BASE_URL) -> str:
+    return base_url + "/wws/" + location.split("#")[-1]
+
+
+def extract_iframe_link(login_page_text: str, base_url: str = BASE_URL) -> str:
+    soup = BeautifulSoup(login_page_text, features="html.parser")
+    for link in soup.find_all("a"):
+        if link.get("href", "").startswith("100001.php"):
+            return base_url + "/wws/" + link["href"]
+
+    raise NoIframeFoundError()
+
+
+def build_login_payload(email: str, password: str) -> dict:
+    return {
+        "login_login": email,
+        "login_password": password,
+        "login_submit": "Login",
+        "language": 1
+    }
+
+
+def check_login(response_text: str):
+    if "msgbox('The login data could not be found in the database.');" in response_text:
+        raise UnsuccessfulLoginError("Login unsuccessful")
+
+
+# an expired session gets the login form instead of the requested page
+def is_logged_in_page(page_text: str) -> bool:
+    return 'name="login_login"' not in page_text
+
+
+# NAVIGATION
+GROUP_SELECT_ID = "top_select_18"
+CLASS_SELECT_ID = "top_select_19"
+MENU_ID = re.compile(r"^menu_\d+$")
+
+
+# the session id changes between logins, it must not make the same page look different
+def normalize_url(url: str) -> str:
+    parsed = urlparse(url)
+    query = sorted((key, value) for key, value in parse_qsl(parsed.query) if key != "sid")
+    return parsed._replace(query=urlencode(query), fragment="").geturl()
+
+
+class NavEntry:
+    __slots__ = ("kind", "id", "name", "url")
+
+    def __init__(self, kind: str, id: str, name: str, url: str):
+        self.kind = kind
+        # li id for menu entries ("menu_125520"), the url without session id for groups and classes
+        self.id = id
+        self.name = name
+        self.url = url
+
+    def __repr__(self):
+        return f"<NavEntry {self.kind} {self.id!r} {self.name!r}>"
+
+
+# groups, classes, languages, module menu entries and the mail link of a logged-in page, from a single parse.
+# every entry can be looked up by id or name
+class NavigationIndex:
+    KINDS = ("group", "class", "language", "menu")
+
+    def __init__(self):
+        self.by_id: dict[str, dict[str, NavEntry]] = {kind: {} for kind in self.KINDS}
+        self.by_name: dict[str, dict[str, NavEntry]] = {kind: {} for kind in self.KINDS}
+        self.mail_link: str = None
+
+    def add(self, entry: NavEntry):
+        self.by_id[entry.kind][entry.id] = entry
+        # the first entry with a name wins, like the first match of a linear search
+        self.by_name[entry.kind].setdefault(entry.name, entry)
+
+    def get(self, kind: str, key: str) -> NavEntry:
+        return self.by_id[kind].get(key) or self.by_name[kind].get(key)
+
+    def entries(self, kind: str) -> list[NavEntry]:
+        return list(self.by_id[kind].values())
+
+    @classmethod
+    def from_page(cls, page_text: str, base_url: str = BASE_URL):
+        index = cls()
+        soup = BeautifulSoup(page_text, features="html.parser", parse_only=SoupStrainer(["select", "li", "a"]))
+        for select in soup.find_all("select"):
+            if select.get("id") == GROUP_SELECT_ID:
+                kind = "group"
+            elif select.get("id") == CLASS_SELECT_ID:
+                kind = "class"
+            elif select.get("name") == "language":
+                kind = "language"
+            else:
+                continue
+            for option in select.find_all("option"):
+                value = option.get("value")
+                if not value:
+                    continue
+                if kind == "language":
+                    index.add(NavEntry(kind, value, option.text.strip(), value))
+                # the group and class selects also hold entries like the one to join a group
+                elif "top_option" in option.get("class", []):
+                    url = urljoin(base_url + "/wws/", value)
+                    index.add(NavEntry(kind, normalize_url(url), option.text.strip(), url))
+        for item in soup.find_all("li", {"id": MENU_ID}):
+            link = item.find("a")
+            if link and link.get("href"):
+                index.add(NavEntry("menu", item["id"], link.text.strip(), urljoin(base_url + "/wws/", link["href"])))
+        for link in soup.find_all("a"):
+            if link.text.strip() == "Mail service" and link.get("href"):
+                index.mail_link = urljoin(base_url + "/wws/", link["href"])
+                break
+        return index
+
+
+# SESSION CACHE
+# one file per account with the session cookies and the url of the logged-in page,
+# readable by the owner only since the cookies grant full access to the account
+class SessionCache:
+    def __init__(self, cache_dir: str = None):
+        self.cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "lernsax")
+
+    def path(self, email: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(email.encode()).hexdigest()[:24] + ".json")
+
+    def load(self, email: str) -> dict:
+        try:
+            with open(self.path(email), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, email: str, session: requests.Session, page_url: str):
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        # the mode of makedirs and os.open only applies to what they create and is cut by the umask,
+        # a directory or file from before is tightened here
+        os.chmod(self.cache_dir, 0o700)
+        data = {
+            "url": page_url,
+            "cookies": [
+                {
+                    "name": c.name,
+                    "value": c.value,
+                    "domain": c.domain,
+                    "path": c.path,
+                    "secure": c.secure,
+                    "expires": c.expires,
+                } for c in session.cookies
+            ],
+        }
+        fd = os.open(self.path(email), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        if hasattr(os, "fchmod"):
+            os.fchmod(fd, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+
+    def clear(self, email: str):
+        try:
+            os.remove(self.path(email))
+        except FileNotFoundError:
+            pass
+
+
+class LoginClient:
+    def __init__(
+        self,
+        email: str,
+        password: str,
+        session_cache: SessionCache = None,
+        rate_limiter: HostRateLimiter = None,
+        transport: Transport = None,
+        base_url: str = BASE_URL,
+        download_url: str = DOWNLOAD_URL,
+        webdav_url: str = WEBDAV_URL,
+        metrics: Metrics = None,
+        data_dir: str = DATA_DIR,
+    ):
+        self.logged_in_page = None
+        self.session_cache = session_cache
+        self._navigation: NavigationIndex = None
+        self._logger = logging.getLogger(self.__class__.__name__)
+        if not email or not password:
+            raise MissingUserInfoError("User not valid or found")
+        self.session = requests.session()
+        # timeouts, retries and backpressure for every request of this client
+        self.transport = transport or Transport(rate_limiter=rate_limiter, limiter=AdaptiveLimiter())
+        self.transport.mount(self.session)
+        self.pool_size = self.transport.pool_size
+        self._pool_lock = threading.Lock()
+        self.metrics = metrics or REGISTRY
+        instrument_session(self.session, self.metrics)
+        self.base_url = base_url
+        self.download_url = download_url
+        self.webdav_url = webdav_url
+        self.links = {
+             "init_url": base_url,
+         }
+
+        self.email = email
+        self.password = password
+
+        # only created by the clients that write into it
+        self.downloads_folder = f"{data_dir}/{self.email.split('@')[0]}"
+
+    # a new login replaces the logged-in page, and with it the navigation index built from it
+    @property
+    def logged_in_page(self) -> requests.Response:
+        return self._logged_in_page
+
+    @logged_in_page.setter
+    def logged_in_page(self, r: requests.Response):
+        self._logged_in_page = r
+        self._navigation = None
+
+    @property
+    def navigation(self) -> NavigationIndex:
+        if self._navigation is None:
+            if self.logged_in_page is None:
+                self.login()
+            self._navigation = NavigationIndex.from_page(self.logged_in_page.text, self.base_url)
+        return self._navigation
+
+    # the default pool only keeps 10 connections per host, which throttles threaded callers. the pool only grows:
+    # callers size it before starting their threads, so the smaller calls of nested workers (like the folders of
+    # download_everything) find it large enough and never remount it under requests in flight
+    def configure_pool(self, pool_size: int):
+        with self._pool_lock:
+            if pool_size > self.pool_size:
+                self.transport.mount(self.session, pool_size)
+                self.pool_size = pool_size
+
+    @classmethod
+    def from_creds(cls, identifier, creds_file: str = "creds.json", **kwargs):
+        user = load_creds(identifier, creds_file)
+        return cls(user.get("username", ""), user.get("password", ""), **kwargs)
+
+    def get_site_visit_redirect_url(self):
+        self._logger.info(f" -> Visiting {self.base_url}/ and retrieving redirect url...")
+
+        r = self.session.get(self.base_url)
+        return extract_redirect_url(r.text, self.base_url)
+
+    def resolve_php_redirect(self, url: str) -> str:
+        self._logger.info(f" -> Resolving redirect url {url!r}...")
+
+        r = self.session.get(url, allow_redirects=False)
+        return extract_login_page_url(r.headers["Location"], self.base_url)
+
+    def get_iframe_link(self, url: str) -> str:
+        self._logger.info(f" -> Getting link of iframe...")
+
+        r = self.session.get(url)
+        return extract_iframe_link(r.text, self.base_url)
+
+    def perform_login(self, login_url: str) -> requests.Response:
+        self._logger.info(" -> Performing login...")
+
+        payload = build_login_payload(self.email, self.password)
+        r = self.session.post(login_url, data=payload)
+        check_login(r.text)
+
+        self._logger.info(f" * Successfully logged in as {self.email!r}")
+
+        self.logged_in_page = r
+        return r
+
+    # a cached session is checked with a single request for the logged-in page
+    def restore_session(self) -> bool:
+        cached = self.session_cache.load(self.email)
+        if not cached:
+            return False
+        self._logger.info(f" -> Validating cached session for {self.email!r}...")
+
+        for cookie in cached["cookies"]:
+            self.session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie["domain"],
+                path=cookie["path"],
+                secure=cookie["secure"],
+                expires=cookie["expires"],
+            )
+        r = self.session.get(cached["url"])
+        if r.status_code != 200 or not is_logged_in_page(r.text):
+            self._logger.info(" * Cached session expired")
+            self.session.cookies.clear()
+            self.session_cache.clear(self.email)
+            return False
+
+        self._logger.info(f" * Restored session for {self.email!r}")
+        self.logged_in_page = r
+        return True
+
+    def login(self) -> requests.Response:
+        if self.session_cache is not None and self.restore_session():
+            return self.logged_in_page
+
+        self._logger.info(f" * Initializing session for {self.email!r}...")
+
+        redirect_url = self.get_site_visit_redirect_url()
+        login_page_url = self.resolve_php_redirect(redirect_url)
+        login_page_iframe_url = self.get_iframe_link(login_page_url)
+        r = self.perform_login(login_page_iframe_url)
+        if self.session_cache is not None:
+            self.session_cache.save(self.email, self.session, r.url)
+        return r
@@ -0,0 +1,315 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+
+from . import __version__
+
+# the subcommands import the clients (and with them requests, bs4, tqdm and webdav3) when they run,
+# so --help, argument errors and the local search start without loading any of them
+
+
+class CliError(Exception):
+    ...
+
+
+def emit(data):
+    print(json.dumps(data, ensure_ascii=False, default=repr), flush=True)
+
+
+def mail_line(folder: str, data: dict) -> dict:
+    return {
+        "folder": folder,
+        "number": data["number"],
+        "date": data["date"],
+        "author": data["author_address"] or data["author_name"],
+        "subject": data["subject"],
+        "attachments": data["attachments"],
+    }
+
+
+def parse_day(value: str) -> int:
+    try:
+        return int(datetime.strptime(value, "%Y-%m-%d").timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a date like 2024-01-31, got {value!r}")
+
+
+# ACCOUNTS
+# an --email with the password in LERNSAX_PASSWORD, or an --account from the creds file
+def account_creds(args) -> tuple[str, str]:
+    if args.email:
+        password = os.environ.get("LERNSAX_PASSWORD", "")
+        if not password:
+            raise CliError("--email needs the password in LERNSAX_PASSWORD")
+        return args.email, password
+    if not args.account:
+        raise CliError("no account given, use --account (or LERNSAX_ACCOUNT) or --email (or LERNSAX_EMAIL)")
+    try:
+        with open(args.creds, "r") as f:
+            user = json.load(f).get(args.account)
+    except OSError as e:
+        raise CliError(f"could not read {args.creds!r}: {e.strerror}")
+    if not user:
+        raise CliError(f"account {args.account!r} not found in {args.creds!r}")
+    return user.get("username", ""), user.get("password", "")
+
+
+# same layout as LoginClient.downloads_folder, for commands that only read local data
+def downloads_folder(args) -> str:
+    email = args.email or account_creds(args)[0]
+    return f"{args.data_dir}/{email.split('@')[0]}"
+
+
+def login(args):
+    from .auth import LoginClient, SessionCache
+
+    email, password = account_creds(args)
+    auth = LoginClient(
+        email,
+        password,
+        session_cache=None if args.no_session_cache else SessionCache(),
+        data_dir=args.data_dir,
+    )
+    auth.login()
+    return auth
+
+
+# COMMANDS
+# each returns the exit code, results go to stdout as json and logs to stderr
+def cmd_login(args) -> int:
+    start = time.perf_counter()
+    auth = login(args)
+    emit({"email": auth.email, "seconds": round(time.perf_counter() - start, 3)})
+    return 0
+
+
+def cmd_mail_sync(args) -> int:
+    from .mail import WebMailClient
+
+    client = WebMailClient(login(args))
+    failed_folders = client.download_everything(
+        workers=args.workers, incremental=not args.full, folder_workers=args.folder_workers
+    )
+    emit({
+        "folders": len(client.folders),
+        "failed_folders": failed_folders,
+        "failed_mails": [(mail.number, repr(error)) for mail, error in client.failed_mails],
+    })
+    return 1 if failed_folders or client.failed_mails else 0
+
+
+def cmd_mail_search(args) -> int:
+    import sqlite3
+
+    from .store import MailStore, SearchUnavailableError
+
+    path = f"{downloads_folder(args)}/mail/mails.sqlite"
+    if not os.path.exists(path):
+        raise CliError(f"no mails stored in {path!r} yet, run `lernsax mail sync` first")
+    store = MailStore(path)
+    try:
+        for folder, data, score in store.search(
+            args.query, folder=args.folder, since=args.since, until=args.until, limit=args.limit
+        ):
+            emit(mail_line(folder, data) | {"score": round(score, 3)})
+    except SearchUnavailableError as e:
+        raise CliError(str(e))
+    except sqlite3.OperationalError as e:
+        raise CliError(f"invalid query {args.query!r}: {e}")
+    finally:
+        store.close()
+    return 0
+
+
+# one json line per new mail until interrupted, or for --duration seconds
+def cmd_mail_watch(args) -> int:
+    from .mail import WebMailClient
+    from .watch import MailWatcher
+
+    client = WebMailClient(login(args))
+    if args.folder:
+        client.get_mail_link()
+        client.find_mail_folders()
+        client.switch_mail_folder(args.folder)
+    watcher = MailWatcher([client], min_interval=args.min_interval, max_interval=args.max_interval)
+    watcher.run(lambda client, mail: emit(mail_line(client.folder, mail.to_json())), duration=args.duration)
+    return 1 if watcher.failing() else 0
+
+
+def cmd_mail_export(args) -> int:
+    from .mail import WebMailClient
+
+    client = WebMailClient(login(args))
+    result = client.export_eml(target=args.target, mailbox_format=args.format, workers=args.workers, folders=args.folder)
+    emit(result)
+    return 1 if result["failed"] else 0
+
+
+def cmd_mail_send(args) -> int:
+    from .mail import OutgoingMail, WebMailClient
+
+    if args.body_file == "-":
+        body = sys.stdin.read()
+    elif args.body_file:
+        with open(args.body_file, "r") as f:
+            body = f.read()
+    else:
+        body = args.body
+    for path in args.attach:
+        if not os.path.isfile(path):
+            raise CliError(f"attachment {path!r} not found")
+
+    client = WebMailClient(login(args))
+    # one message per --to, or a single one to all of them with --together
+    receivers = [args.to] if args.together else [[receiver] for receiver in args.to]
+    messages = [OutgoingMail(receiver, args.subject, body, args.cc, args.bcc, args.attach) for receiver in receivers]
+    results = client.send_mails(messages, workers=args.workers, rate=args.rate)
+    for result in results:
+        emit({"to": result.message.receiver, "ok": result.ok, "status": result.status, "error": result.error})
+    return 0 if all(result.ok for result in results) else 1
+
+
+def cmd_webdav_sync(args) -> int:
+    from .webdav import WebDAVClient
+
+    report = WebDAVClient(login(args)).sync(local_dir=args.local_dir, root=args.root, workers=args.workers, delete=args.delete)
+    emit(report)
+    return 1 if report["failed"] else 0
+
+
+def cmd_webdav_upload(args) -> int:
+    from .webdav import WebDAVClient
+
+    if not os.path.isdir(args.local_dir):
+        raise CliError(f"{args.local_dir!r} is not a directory")
+    report = WebDAVClient(login(args)).upload_tree(args.local_dir, args.remote_root, workers=args.workers)
+    emit(report)
+    return 1 if report["failed"] else 0
+
+
+def cmd_groups_list(args) -> int:
+    from .group import GroupClient
+
+    for group in GroupClient(login(args)).get_groups().values():
+        emit({"name": group.name, "kind": group.kind, "id": group.id})
+    return 0
+
+
+def cmd_groups_download(args) -> int:
+    from .group import GroupClient
+
+    client = GroupClient(login(args))
+    names = args.names or list(client.get_groups())
+    failed = False
+    for name in names:
+        root, errors = client.download_group(name, workers=args.workers)
+        emit({
+            "group": name,
+            "files": len(root.files()),
+            "failed_folders": client.failed_folders,
+            "failed_files": [(url, repr(error)) for url, error in errors],
+        })
+        failed = failed or bool(errors or client.failed_folders)
+    return 1 if failed else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="lernsax", description="LernSax mail, WebDAV and group file storage")
+    parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
+    parser.add_argument("--account", default=os.environ.get("LERNSAX_ACCOUNT"), help="identifier in the creds file")
+    parser.add_argument("--creds", default=os.environ.get("LERNSAX_CREDS", "creds.json"))
+    parser.add_argument("--email", default=os.environ.get("LERNSAX_EMAIL"), help="log in with the password in LERNSAX_PASSWORD")
+    parser.add_argument("--data-dir", default=os.environ.get("LERNSAX_DATA", "data"))
+    parser.add_argument("--no-session-cache", action="store_true", help="always log in instead of reusing the last session")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+    parser.add_argument("--progress", action="store_true", help="show progress bars even when stderr is not a terminal")
+    commands = parser.add_subparsers(dest="command", metavar="command", required=True)
+
+    login_parser = commands.add_parser("login", help="log in and report how long it took")
+    login_parser.set_defaults(func=cmd_login)
+
+    mail = commands.add_parser("mail", help="mail service").add_subparsers(dest="action", metavar="action", required=True)
+    sync = mail.add_parser("sync", help="download new and changed mails of every folder")
+    sync.add_argument("--workers", type=int, default=4, help="parallel requests per folder")
+    sync.add_argument("--folder-workers", type=int, help="folders downloaded at the same time, all by default")
+    sync.add_argument("--full", action="store_true", help="fetch every mail again instead of only new and changed ones")
+    sync.set_defaults(func=cmd_mail_sync)
+    search = mail.add_parser("search", help="full-text search over the stored mails, without logging in")
+    search.add_argument("query", help="fts5 query, e.g. 'subject:klausur AND from:schmidt' or '\"exact phrase\"'")
+    search.add_argument("--folder")
+    search.add_argument("--since", type=parse_day, help="YYYY-MM-DD")
+    search.add_argument("--until", type=parse_day, help="YYYY-MM-DD")
+    search.add_argument("--limit", type=int, default=20)
+    search.set_defaults(func=cmd_mail_search)
+    watch = mail.add_parser("watch", help="print new mails as they come in")
+    watch.add_argument("--folder", help="inbox by default")
+    watch.add_argument("--min-interval", type=float, default=30.0, help="seconds between polls while mail comes in")
+    watch.add_argument("--max-interval", type=float, default=600.0, help="seconds between polls of a quiet mailbox")
+    watch.add_argument("--duration", type=float, help="stop after this many seconds")
+    watch.set_defaults(func=cmd_mail_watch)
+    export = mail.add_parser("export", help="export the raw messages to maildir or mbox")
+    export.add_argument("--format", choices=("maildir", "mbox"), default="maildir")
+    export.add_argument("--target")
+    export.add_argument("--folder", action="append", help="only this folder, can be repeated")
+    export.add_argument("--workers", type=int, default=8)
+    export.set_defaults(func=cmd_mail_export)
+    send = mail.add_parser("send", help="send a mail to one or many receivers")
+    send.add_argument("--to", action="append", required=True, help="can be repeated, every receiver gets a mail of their own")
+    send.add_argument("--together", action="store_true", help="send a single mail to all --to receivers")
+    send.add_argument("--cc", action="append", default=[])
+    send.add_argument("--bcc", action="append", default=[])
+    send.add_argument("--subject", required=True)
+    body = send.add_mutually_exclusive_group(required=True)
+    body.add_argument("--body")
+    body.add_argument("--body-file", help="file with the body, - for stdin")
+    send.add_argument("--attach", action="append", default=[], help="file to attach, can be repeated")
+    send.add_argument("--workers", type=int, default=4)
+    send.add_argument("--rate", type=float, default=2.0, help="mails per second")
+    send.set_defaults(func=cmd_mail_send)
+
+    webdav = commands.add_parser("webdav", help="WebDAV share").add_subparsers(dest="action", metavar="action", required=True)
+    dav_sync = webdav.add_parser("sync", help="mirror the share incrementally")
+    dav_sync.add_argument("--local-dir")
+    dav_sync.add_argument("--root", default="/")
+    dav_sync.add_argument("--workers", type=int, default=8)
+    dav_sync.add_argument("--delete", choices=("keep", "delete", "archive"), default="keep", help="what happens to files removed remotely")
+    dav_sync.set_defaults(func=cmd_webdav_sync)
+    upload = webdav.add_parser("upload", help="upload a local folder")
+    upload.add_argument("local_dir")
+    upload.add_argument("remote_root", nargs="?", default="/")
+    upload.add_argument("--workers", type=int, default=4)
+    upload.set_defaults(func=cmd_webdav_upload)
+
+    groups = commands.add_parser("groups", help="group and class file storage").add_subparsers(dest="action", metavar="action", required=True)
+    groups_list = groups.add_parser("list", help="list groups and classes")
+    groups_list.set_defaults(func=cmd_groups_list)
+    download = groups.add_parser("download", help="download the file storage of groups, all by default")
+    download.add_argument("names", nargs="*", help="group names or ids")
+    download.add_argument("--workers", type=int, default=8)
+    download.set_defaults(func=cmd_groups_download)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=("WARNING", "INFO", "DEBUG")[min(args.verbose, 2)], stream=sys.stderr)
+    # cron and pipelines get no progress bars
+    if not args.progress and not sys.stderr.isatty():
+        os.environ.setdefault("TQDM_DISABLE", "1")
+    try:
+        return args.func(args)
+    except CliError as e:
+        print(f"lernsax: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    except Exception as e:
+        # login failures and the like, the traceback is only interesting with -v
+        if args.verbose:
+            raise
+        print(f"lernsax: {e.__class__.__name__}: {e}", file=sys.stderr)
+        return 1
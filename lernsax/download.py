@@ -0,0 +1,158 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests
+from tqdm import tqdm
+
+from .metrics import Metrics, REGISTRY
+
+CHUNK_SIZE = 256 * 1024
+
+
+def update_checksum(sha, path: str, chunk_size: int = CHUNK_SIZE):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha
+
+
+def file_checksum(path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    return update_checksum(hashlib.sha256(), path, chunk_size).hexdigest()
+
+
+# bytes an interrupted transfer left in a .part file
+def part_size(part: str) -> int:
+    return os.path.getsize(part) if os.path.exists(part) else 0
+
+
+# size, sha256 and local mtime of every completed download in a folder, stored next to the files,
+# plus whatever the caller wants to remember about the remote version (etag, mtime)
+class DownloadManifest:
+    def __init__(self, manifest_file: str):
+        self.manifest_file = manifest_file
+        self.folder = os.path.dirname(manifest_file)
+        self._lock = threading.Lock()
+        self.entries: dict = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, path: str) -> dict:
+        return self.entries.get(os.path.relpath(path, self.folder))
+
+    def set(self, path: str, size: int, sha256: str, **meta):
+        with self._lock:
+            self.entries[os.path.relpath(path, self.folder)] = {"size": size, "sha256": sha256, **meta}
+
+    def update(self, path: str, **fields):
+        with self._lock:
+            self.entries[os.path.relpath(path, self.folder)].update(fields)
+
+    # a file with the size and mtime it had when it was downloaded is not read again. only a touched one is
+    # hashed, and if it still matches its new mtime is recorded, so the next run can skip it again
+    def is_complete(self, path: str, chunk_size: int = CHUNK_SIZE) -> bool:
+        entry = self.get(path)
+        if not entry or not os.path.exists(path):
+            return False
+        stat = os.stat(path)
+        if stat.st_size != entry["size"]:
+            return False
+        if stat.st_mtime_ns == entry.get("local_mtime"):
+            return True
+        if file_checksum(path, chunk_size) != entry["sha256"]:
+            return False
+        self.update(path, local_mtime=stat.st_mtime_ns)
+        return True
+
+    def remove(self, path: str):
+        with self._lock:
+            self.entries.pop(os.path.relpath(path, self.folder), None)
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.manifest_file + ".tmp", "w+") as f:
+                json.dump(self.entries, f)
+            os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+
+class Downloader:
+    def __init__(
+        self,
+        session: requests.Session,
+        manifest: DownloadManifest,
+        chunk_size: int = CHUNK_SIZE,
+        metrics: Metrics = None,
+        step: str = "attachment",
+    ):
+        self.session = session
+        self.manifest = manifest
+        self.chunk_size = chunk_size
+        self.metrics = metrics or REGISTRY
+        self.step = step
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+    def is_complete(self, path: str) -> bool:
+        return self.manifest.is_complete(path, self.chunk_size)
+
+    # returns False if the file was already complete on disk. meta is stored in the manifest entry,
+    # an etag in it makes the server send the whole file if it changed since the part file was started
+    def download(self, url: str, path: str, meta: dict = None) -> bool:
+        meta = meta or {}
+        if self.is_complete(path):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # an interrupted transfer leaves a .part file, which is continued with a range request
+        part = path + ".part"
+        offset = part_size(part)
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+        if offset and meta.get("etag"):
+            headers["If-Range"] = meta["etag"]
+        sha = hashlib.sha256()
+        with self.session.get(url, headers=headers, stream=True) as r:
+            # 416 on a resume means the part file already holds the whole body
+            part_complete = offset and r.status_code == 416
+            if not part_complete:
+                r.raise_for_status()
+                if offset and r.status_code != 206:
+                    self._logger.info(f" * server ignored range request for {url!r}, restarting")
+                    offset = 0
+            if offset:
+                update_checksum(sha, part, self.chunk_size)
+            if not part_complete:
+                # only the time spent writing counts as disk time, not waiting for the network
+                write_time, written = 0.0, 0
+                with open(part, "ab" if offset else "wb") as f:
+                    for chunk in r.iter_content(chunk_size=self.chunk_size):
+                        start = time.perf_counter()
+                        f.write(chunk)
+                        write_time += time.perf_counter() - start
+                        written += len(chunk)
+                        sha.update(chunk)
+                self.metrics.observe("lernsax_disk_write_seconds", write_time, step=self.step)
+                self.metrics.inc("lernsax_disk_write_bytes_total", written, step=self.step)
+
+        os.replace(part, path)
+        stat = os.stat(path)
+        self.manifest.set(path, stat.st_size, sha.hexdigest(), local_mtime=stat.st_mtime_ns, **meta)
+        return True
+
+    # jobs are (url, path) or (url, path, meta) tuples, the result holds the error for every failed job in job order
+    def download_all(self, jobs: list[tuple], workers: int = 1) -> list[tuple[str, Exception]]:
+        errors: dict[int, Exception] = {}
+        try:
+            with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+                futures = {executor.submit(self.download, *job): i for i, job in enumerate(jobs)}
+                for done, future in enumerate(tqdm(as_completed(futures), total=len(futures)), start=1):
+                    if future.exception() is not None:
+                        errors[futures[future]] = future.exception()
+                    if done % 50 == 0:
+                        self.manifest.save()
+        finally:
+            self.manifest.save()
+        return [(jobs[i][0], errors[i]) for i in sorted(errors)]
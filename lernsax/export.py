@@ -0,0 +1,148 @@
+import os
+import re
+import threading
+import time
+
+EXPORT_FORMATS = ("maildir", "mbox")
+# mboxrd: every line that would read as a message separator gets one more ">"
+FROM_LINE = re.compile(rb"^>*From ")
+
+
+# maildir info flags of a message, in the alphabetical order the spec asks for
+def maildir_flags(flagged: bool, answered: bool, read: bool) -> str:
+    return "F" * flagged + "R" * answered + "S" * read
+
+
+# append-only log of exported messages, one "folder<TAB>number<TAB>mbox offset" line per message.
+# a line is only written once the message is complete on disk, so a resumed export skips exactly those
+class ExportCheckpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: dict[str, set[int]] = {}
+        # end of the last complete message in the mbox file of every folder
+        self.offsets: dict[str, int] = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t")
+                    # a torn last line from a crash is ignored
+                    if len(parts) != 3 or not parts[1].isdigit():
+                        continue
+                    self.done.setdefault(parts[0], set()).add(int(parts[1]))
+                    if parts[2]:
+                        self.offsets[parts[0]] = max(self.offsets.get(parts[0], 0), int(parts[2]))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.f = open(path, "a")
+
+    def is_done(self, folder: str, number: int) -> bool:
+        return number in self.done.get(folder, ())
+
+    def record(self, folder: str, number: int, offset: int = None):
+        with self._lock:
+            self.f.write(f"{folder}\t{number}\t{'' if offset is None else offset}\n")
+            self.f.flush()
+            self.done.setdefault(folder, set()).add(number)
+            if offset is not None:
+                self.offsets[folder] = max(self.offsets.get(folder, 0), offset)
+
+    def close(self):
+        self.f.close()
+
+
+# one maildir per folder. messages are streamed into tmp/ and renamed into new/ (unread) or cur/ (with flags),
+# names only depend on the mail, so a message exported twice replaces itself
+class MaildirWriter:
+    def __init__(self, path: str, folder: str, checkpoint: ExportCheckpoint, host: str = "lernsax"):
+        self.path = path
+        self.folder = folder
+        self.checkpoint = checkpoint
+        self.host = host
+        for sub in ("tmp", "new", "cur"):
+            os.makedirs(os.path.join(path, sub), exist_ok=True)
+
+    def add(self, number: int, chunks, flags: str = "", sender: str = None, timestamp: int = None) -> int:
+        key = f"{timestamp or 0}.M{number}.{self.host}"
+        tmp = os.path.join(self.path, "tmp", key)
+        written = 0
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+                written += len(chunk)
+        # readers take the delivery date from the mtime
+        if timestamp:
+            os.utime(tmp, (timestamp, timestamp))
+        if flags:
+            os.replace(tmp, os.path.join(self.path, "cur", f"{key}:2,{flags}"))
+        else:
+            os.replace(tmp, os.path.join(self.path, "new", key))
+        self.checkpoint.record(self.folder, number)
+        return written
+
+    def close(self):
+        ...
+
+
+# one mboxrd file per folder. the network stream goes to a temporary file first, so the lock on the mbox
+# is only held while copying from disk, and the checkpoint is written under the same lock
+class MboxWriter:
+    def __init__(self, path: str, folder: str, checkpoint: ExportCheckpoint):
+        self.path = path
+        self.folder = folder
+        self.checkpoint = checkpoint
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # messages appended after the last checkpoint line are incomplete or unrecorded, they are written again
+        size = checkpoint.offsets.get(folder, 0)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+        self.f = open(path, "ab")
+
+    @staticmethod
+    def status_headers(flags: str) -> list[bytes]:
+        status = ("R" if "S" in flags else "") + "O"
+        x_status = ("A" if "R" in flags else "") + ("F" if "F" in flags else "")
+        headers = [f"Status: {status}\n".encode()]
+        if x_status:
+            headers.append(f"X-Status: {x_status}\n".encode())
+        return headers
+
+    def add(self, number: int, chunks, flags: str = "", sender: str = None, timestamp: int = None) -> int:
+        tmp = f"{self.path}.{number}.tmp"
+        with open(tmp, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        # the separator line has to stay one ascii word for the address, readers split on whitespace
+        if not sender or not sender.isascii() or any(c.isspace() for c in sender):
+            sender = "MAILER-DAEMON"
+        from_line = f"From {sender} {time.asctime(time.gmtime(timestamp or 0))}\n".encode()
+        written = 0
+        with self._lock:
+            self.f.write(from_line)
+            in_headers, last = True, b"\n"
+            with open(tmp, "rb") as src:
+                for line in src:
+                    line = line.replace(b"\r\n", b"\n")
+                    if in_headers and line == b"\n":
+                        in_headers = False
+                        for header in self.status_headers(flags):
+                            self.f.write(header)
+                    elif not in_headers and FROM_LINE.match(line):
+                        line = b">" + line
+                    self.f.write(line)
+                    written += len(line)
+                    last = line
+            if in_headers:
+                for header in self.status_headers(flags):
+                    self.f.write(header)
+            if not last.endswith(b"\n"):
+                self.f.write(b"\n")
+            self.f.write(b"\n")
+            self.f.flush()
+            self.checkpoint.record(self.folder, number, self.f.tell())
+        os.remove(tmp)
+        return written
+
+    def close(self):
+        self.f.close()
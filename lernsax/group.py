@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import re
+import requests
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import urljoin
+
+from .auth import LoginClient, NavigationIndex, BASE_URL, normalize_url
+from .download import Downloader, DownloadManifest
+
+FILE_STORAGE_MENU_ID = "menu_125520"
+# the storage table has further classes ("table_list space sort_skip_first"), a strainer compares the whole attribute
+STORAGE_TABLE_CLASS = re.compile(r"(^|\s)table_list(\s|$)")
+# data-drag_downloadurl of a file row is "<mime type>:<file name>:<absolute url>"
+DRAG_DOWNLOAD_URL = re.compile(r"^(?P<mime>[^:]*):(?P<name>.*):(?P<url>https?://.*)$")
+
+
+class GroupNotFoundError(Exception):
+    ...
+
+
+class FileStorageNotFoundError(Exception):
+    ...
+
+
+class Group:
+    def __init__(self, name: str, url: str, kind: str = "group", id: str = None):
+        self.name = name
+        self.url = url
+        self.id = id or normalize_url(url)
+        # "group" or "class", depending on the select it was found in
+        self.kind = kind
+
+    def __repr__(self):
+        return f"<Group {self.kind} {self.name!r}>"
+
+
+class StorageEntry:
+    __slots__ = ("path", "name", "url", "is_dir", "download_url", "mime", "children")
+
+    def __init__(self, path: str, name: str, url: str, is_dir: bool, download_url: str = None, mime: str = None):
+        # path is "/" for the storage root and "/<folder>/.../<name>" below it, independent of urls and session ids
+        self.path = path
+        self.name = name
+        self.url = url
+        self.is_dir = is_dir
+        self.download_url = download_url
+        self.mime = mime
+        self.children: list[StorageEntry] = []
+
+    def __repr__(self):
+        return f"<StorageEntry {self.path!r}>"
+
+    def walk(self):
+        stack = [self]
+        while stack:
+            entry = stack.pop()
+            yield entry
+            stack.extend(reversed(entry.children))
+
+    def files(self) -> list:
+        return [entry for entry in self.walk() if not entry.is_dir]
+
+    def to_json(self) -> dict:
+        data = {slot: getattr(self, slot) for slot in self.__slots__ if slot != "children"}
+        if self.is_dir:
+            data["children"] = [child.to_json() for child in self.children]
+        return data
+
+    @classmethod
+    def from_json(cls, data: dict):
+        entry = cls(data["path"], data["name"], data["url"], data["is_dir"], data["download_url"], data["mime"])
+        entry.children = [cls.from_json(child) for child in data.get("children", [])]
+        return entry
+
+
+# HTML EXTRACTION
+# group pages have the same module menu as the start page, with the group's own modules
+def extract_file_storage_link(group_page_text: str, base_url: str = BASE_URL) -> str:
+    entry = NavigationIndex.from_page(group_page_text, base_url).get("menu", FILE_STORAGE_MENU_ID)
+    if entry is None:
+        raise FileStorageNotFoundError("The group has no file storage menu entry.")
+    return entry.url
+
+
+# returns the urls of the opened folder row (the folder itself), (name, url) of the sub folders and
+# (name, url, download url, mime type) of the files of a folder. the folder rows also hold links back
+# to the folder itself and its parent, the crawler drops them as already seen
+def extract_storage_entries(storage_page_text: str, base_url: str = BASE_URL) -> tuple[list, list, list]:
+    soup = BeautifulSoup(storage_page_text, features="html.parser", parse_only=SoupStrainer("table", {"class": STORAGE_TABLE_CLASS}))
+    table = soup.find("table", {"class": "table_list"})
+    if not table:
+        return [], [], []
+    current, folders, files = [], [], []
+    for row in table.find_all("tr", {"class": "files_item_folder_open"}):
+        link = row.find("a")
+        if link and link.get("href"):
+            current.append(urljoin(base_url + "/wws/", link["href"]))
+    for row in table.find_all("tr", {"class": "files_item_folder"}):
+        link = row.find("a")
+        if link and link.get("href"):
+            folders.append((link.text.strip(), urljoin(base_url + "/wws/", link["href"])))
+    for row in table.find_all("tr", {"class": "files_item_file"}):
+        link = row.find("a")
+        match = DRAG_DOWNLOAD_URL.match(row.get("data-drag_downloadurl", ""))
+        if not match:
+            continue
+        url = urljoin(base_url + "/wws/", link["href"]) if link and link.get("href") else match["url"]
+        files.append((match["name"] or link.text.strip(), url, match["url"], match["mime"]))
+    return current, folders, files
+
+
+def safe_name(name: str) -> str:
+    name = name.replace("/", "_").replace("\\", "_").strip()
+    return "_" if name in ("", ".", "..") else name
+
+
+class GroupClient:
+    def __init__(self, auth_client: LoginClient):
+        self.auth_client: LoginClient = auth_client
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.session: requests.Session = self.auth_client.session
+        self.groups: dict[str, Group] = {}
+        # group id -> file storage url, the group page is only fetched once per session
+        self.storage_links: dict[str, str] = {}
+        self.failed_folders: list[tuple[str, str]] = []
+
+    @property
+    def groups_folder(self) -> str:
+        return f"{self.auth_client.downloads_folder}/groups"
+
+    def get_groups(self) -> dict[str, Group]:
+        navigation = self.auth_client.navigation
+        self.groups = {
+            entry.name: Group(entry.name, entry.url, kind, entry.id)
+            for kind in ("group", "class") for entry in navigation.entries(kind)
+        }
+        self._logger.info(f" -> found {len(self.groups)} groups and classes")
+        return self.groups
+
+    # language name -> the value the language select sends, e.g. "Deutsch" -> "de"
+    def get_languages(self) -> dict[str, str]:
+        return {entry.name: entry.id for entry in self.auth_client.navigation.entries("language")}
+
+    # by name or id, groups before classes
+    def get_group(self, key: str) -> Group:
+        navigation = self.auth_client.navigation
+        for kind in ("group", "class"):
+            entry = navigation.get(kind, key)
+            if entry is not None:
+                return Group(entry.name, entry.url, kind, entry.id)
+        raise GroupNotFoundError(f"Group {key!r} not found.")
+
+    def get_file_storage_link(self, group: Group) -> str:
+        if group.id not in self.storage_links:
+            r = self.session.get(group.url)
+            self.storage_links[group.id] = extract_file_storage_link(r.text, self.auth_client.base_url)
+        return self.storage_links[group.id]
+
+    def get_folder(self, url: str) -> tuple[list, list, list]:
+        r = self.session.get(url)
+        r.raise_for_status()
+        with self.auth_client.metrics.timer("lernsax_parse_seconds", step="get_folder"):
+            return extract_storage_entries(r.text, self.auth_client.base_url)
+
+    # CRAWLING
+    # every folder is requested once, however many links point to it, and sub folders are requested
+    # as soon as their parent is parsed, with at most workers requests at a time
+    def crawl(self, group: Group, workers: int = 8, max_depth: int = None) -> StorageEntry:
+        storage_url = self.get_file_storage_link(group)
+        root = StorageEntry("/", group.name, storage_url, True)
+        seen = {normalize_url(storage_url)}
+        self.failed_folders = []
+        self.auth_client.configure_pool(workers)
+        self._logger.info(f" -> crawling file storage of {group.name!r}")
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {executor.submit(self.get_folder, storage_url): (root, 0)}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    folder, depth = running.pop(future)
+                    try:
+                        current, folders, files = future.result()
+                    except (requests.RequestException, ValueError) as e:
+                        self._logger.warning(f" * crawling {folder.path!r} failed: {e!r}")
+                        self.failed_folders.append((folder.path, repr(e)))
+                        continue
+                    seen.update(normalize_url(url) for url in current)
+                    names = set()
+                    for name, url in folders:
+                        key = normalize_url(url)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        child = StorageEntry(self.child_path(folder, name, names), name, url, True)
+                        folder.children.append(child)
+                        if max_depth is None or depth + 1 < max_depth:
+                            running[executor.submit(self.get_folder, url)] = (child, depth + 1)
+                    for name, url, download_url, mime in files:
+                        key = normalize_url(download_url)
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                        folder.children.append(StorageEntry(self.child_path(folder, name, names), name, url, False, download_url, mime))
+
+        files = root.files()
+        self._logger.info(
+            f" -> found {len(files)} files in {sum(entry.is_dir for entry in root.walk())} folders, "
+            f"{len(self.failed_folders)} failed"
+        )
+        return root
+
+    # two entries with the same name in one folder get a numbered suffix, so paths stay unique
+    def child_path(self, folder: StorageEntry, name: str, names: set) -> str:
+        name = safe_name(name)
+        candidate, i = name, 1
+        while candidate in names:
+            i += 1
+            candidate = f"{name} ({i})"
+        names.add(candidate)
+        return folder.path.rstrip("/") + "/" + candidate
+
+    def save_tree(self, group: Group, root: StorageEntry) -> str:
+        path = f"{self.groups_folder}/{safe_name(group.name)}/index.json"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w+") as f:
+            json.dump(root.to_json(), f, indent=4, ensure_ascii=False)
+        return path
+
+    def download_files(self, group: Group, root: StorageEntry, workers: int = 8) -> list[tuple[str, Exception]]:
+        folder = f"{self.groups_folder}/{safe_name(group.name)}/files"
+        downloader = Downloader(
+            self.session,
+            DownloadManifest(f"{folder}/.manifest.json"),
+            metrics=self.auth_client.metrics,
+            step="group_file",
+        )
+        jobs = [(entry.download_url, folder + entry.path) for entry in root.files()]
+        self._logger.info(f" -> downloading {len(jobs)} files of {group.name!r}")
+        return downloader.download_all(jobs, workers=workers)
+
+    def download_group(self, name: str, workers: int = 8) -> tuple[StorageEntry, list]:
+        group = self.get_group(name)
+        root = self.crawl(group, workers=workers)
+        self.save_tree(group, root)
+        return root, self.download_files(group, root, workers=workers)
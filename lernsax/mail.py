@@ -0,0 +1,953 @@
+import json
+import mimetypes
+import os
+import re
+import requests
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from tqdm import tqdm
+from bs4 import BeautifulSoup, SoupStrainer
+from urllib.parse import urlparse, parse_qs
+
+from .auth import LoginClient, BASE_URL, UnsuccessfulLoginError, is_logged_in_page
+from .download import CHUNK_SIZE, Downloader, DownloadManifest
+from .export import EXPORT_FORMATS, ExportCheckpoint, MaildirWriter, MboxWriter, maildir_flags
+from .store import MailStore
+from .transport import HostRateLimiter
+
+
+class MailLinkNotFoundError(Exception):
+    ...
+
+
+# bits of Mail.flags, the listing icon mail_<n>.svg encodes exactly these bits in n
+READ = 1
+ANSWERED = 2
+FLAGGED = 4
+
+# a compose form is reused for this many seconds, or until the server rejects a post with one of these
+SEND_FORM_MAX_AGE = 15 * 60
+STALE_FORM_STATUS = (403, 404, 410)
+
+DATE_FORMATS = ["%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y", "%Y-%m-%d"]
+SIZE_UNITS = {"B": 1, "BYTE": 1, "BYTES": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_date(date: str):
+    if not date:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return int(datetime.strptime(date, date_format).timestamp())
+        except ValueError:
+            continue
+    return None
+
+
+def parse_size(size: str):
+    match = re.fullmatch(r"([\d.,]+)\s*([A-Za-z]*)", size.strip()) if size else None
+    if not match or match.group(2).upper() not in SIZE_UNITS | {"": 1}:
+        return None
+    return int(float(match.group(1).replace(",", ".")) * SIZE_UNITS.get(match.group(2).upper(), 1))
+
+
+def read_status_to_flags(read_status):
+    # structure: [flagged_status, answered_status, read_status]
+    if not read_status or "unidentified" in read_status:
+        return None
+    flagged, answered, read = read_status
+    return FLAGGED * flagged | ANSWERED * answered | READ * read
+
+
+class Mail:
+    __slots__ = (
+        "author_name",
+        "author_address",
+        "recipient_name",
+        "recipient_address",
+        "subject",
+        "date",
+        "timestamp",
+        "content",
+        "attachments",
+        "flags",
+        "read_link",
+        "eml_link",
+        "size",
+        "size_bytes",
+        "number",
+    )
+
+    def __init__(self, **kwargs):
+        self.author_name = kwargs.get("author_name")
+        self.author_address = kwargs.get("author_address")
+        self.recipient_name = kwargs.get("recipient_name")
+        self.recipient_address = kwargs.get("recipient_address")
+        self.subject = kwargs.get("subject")
+        self.date = kwargs.get("date")
+        self.timestamp = parse_date(self.date)
+        self.content = kwargs.get("content")
+        self.attachments = kwargs.get("attachments", [])
+        self.flags = kwargs["flags"] if "flags" in kwargs else read_status_to_flags(kwargs.get("read_status"))
+        self.read_link = kwargs.get("read_link")
+        self.eml_link = kwargs.get("eml_link")
+        self.size = kwargs.get("size")
+        self.size_bytes = parse_size(self.size)
+        number = kwargs.get("number")
+        self.number = int(number) if number is not None else None
+
+    def __str__(self):
+        if self.recipient_name:
+            return f"<Mail {self.subject!r} to {self.recipient_name} at date {self.date}>"
+        return f"<Mail {self.subject!r} by {self.author_name} at date {self.date}>"
+
+    def __repr__(self):
+        return self.__str__()
+
+    # structure: [flagged_status, answered_status, read_status]
+    @property
+    def read_status(self) -> list:
+        if self.flags is None:
+            return ["unidentified"] * 3
+        return [self.flagged, self.answered, self.read]
+
+    @property
+    def read(self) -> bool:
+        return self.flags is not None and bool(self.flags & READ)
+
+    @property
+    def answered(self) -> bool:
+        return self.flags is not None and bool(self.flags & ANSWERED)
+
+    @property
+    def flagged(self) -> bool:
+        return self.flags is not None and bool(self.flags & FLAGGED)
+
+    def add_info(self, **kwargs):
+        self.content = kwargs.get("content")
+        self.attachments = kwargs.get("attachments", [])
+        self.eml_link = kwargs.get("eml_link", self.eml_link)
+
+    def to_json(self) -> dict:
+        return {
+            "author_name": self.author_name,
+            "author_address": self.author_address,
+            "recipient_name": self.recipient_name,
+            "recipient_address": self.recipient_address,
+            "subject": self.subject,
+            "date": self.date,
+            "content": self.content,
+            "attachments": self.attachments,
+            "read_status": self.read_status,
+            "read_link": self.read_link,
+            "eml_link": self.eml_link,
+            "size": self.size,
+            "number": self.number
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Mail":
+        return cls(**data)
+
+
+def render_mail_list(mails: list[Mail]):
+    return [mail.to_json() for mail in mails]
+
+
+# PAGE MODEL
+# a fetched page keeps its soup, so repeated lookups on the same page only parse it once
+class MailPage:
+    def __init__(self, text: str, parser: str = "html.parser"):
+        self.text = text
+        self.parser = parser
+        self._soup = None
+        self._mail_table = None
+
+    @property
+    def soup(self) -> BeautifulSoup:
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.text, features=self.parser)
+        return self._soup
+
+    # the listing only needs the jail_table div, so without a full soup only that region is parsed
+    @property
+    def mail_table(self):
+        if self._mail_table is None:
+            if self._soup is not None:
+                self._mail_table = self._soup.find("div", {"class": "jail_table"}) or False
+            else:
+                strainer = SoupStrainer("div", {"class": "jail_table"})
+                region = BeautifulSoup(self.text, features=self.parser, parse_only=strainer)
+                self._mail_table = region.find("div", {"class": "jail_table"}) or False
+        return self._mail_table or None
+
+
+def as_page(page, parser: str = "html.parser") -> MailPage:
+    return page if isinstance(page, MailPage) else MailPage(page, parser)
+
+
+# HTML EXTRACTION
+# pure functions on page html, shared by WebMailClient and the async client in aio.py
+def extract_refresh_link(mail_page, base_url: str = BASE_URL) -> str:
+    link = as_page(mail_page).soup.find("a", {"class": "q_105592_1025 block_link_intent_refresh"})
+    if not link or not link.get("href"):
+        raise MailLinkNotFoundError("Refresh link could not be found.")
+    return base_url + link["href"]
+
+
+def extract_other_mail_pages(mail_page) -> list:
+    c = as_page(mail_page).soup.find("p", {"class": "pages"})
+    if not c:
+        return []
+    c = c.find_all("a")
+    return [[x["href"], x.text.strip()] for x in c if x.text.strip()]
+
+
+MAIL_ICON_FLAGS = {f"../pics/mail_{flags}.svg": flags for flags in range(8)}
+
+
+def extract_mails(mail_page) -> list[Mail]:
+    c = as_page(mail_page).mail_table
+    if not c:
+        return []
+    mails = []
+    for row in c.find("tbody").find_all("tr"):
+        # one pass over the cells of a row instead of a separate find per column
+        cells = {}
+        for td in row.find_all("td", recursive=False):
+            for cls in td.get("class", []):
+                if cls.startswith("c_"):
+                    cells[cls] = td
+        subject_link = cells["c_subj"].find("a")
+        author_span = cells["c_from"].find("span") if "c_from" in cells else None
+        recipient_span = cells["c_to"].find("span") if "c_to" in cells else None
+        mails.append(Mail(**{
+            "flags": MAIL_ICON_FLAGS.get(cells["c_env"].find("img")["src"]),
+            "read_link": subject_link["data-popup"],
+            "subject": subject_link.text.strip(),
+            "author_name": author_span.text.strip() if author_span else "",
+            "author_address": author_span["title"] if author_span else "",
+            "recipient_name": recipient_span.text.strip() if recipient_span else "",
+            "recipient_address": recipient_span["title"] if recipient_span else "",
+            "size": cells["c_size"].text.strip(),
+            "date": cells["c_date"].text.strip(),
+            "number": cells["c_cb"].find("input")["name"].split("[")[1].split("]")[0],
+            "content": None,
+        }))
+    return mails
+
+
+def extract_mail_info(mail_txt: str, parser: str = "html.parser") -> dict:
+    soup = BeautifulSoup(mail_txt, features=parser)
+    metadata_table = soup.find("table", {"class": "table_lr"})
+    tr = metadata_table.find_all("tr")
+    mail_data = {
+        "date": tr[1].find("td", {"class": "data"}).text.strip(),
+        "sender": tr[0].find("span")["title"],
+        "recipient": [span["title"] for span in tr[2].find_all("span")],
+        "subject": tr[3].find("td", {"class", "data"}).text.strip(),
+        "eml_link": tr[-1].find("a")["href"],
+        "content": str(soup.find("p", {"class": "panel"})).replace("<br/>", "\n"),
+        "attachments": [],
+    }
+    if len(tr) != 5:
+        mail_data["attachments"] = [
+            att.find("a")["href"] for att in tr[-2].find_all("div")[:-1]
+        ]
+        mail_data["attachments"] = [
+            parse_qs(urlparse(url).query).get("path")[0] for url in mail_data["attachments"] if url != "#"
+        ]
+    return mail_data
+
+
+# only the metadata table of a detail page, for callers that just need the link to the raw message
+def extract_eml_link(mail_txt: str) -> str:
+    soup = BeautifulSoup(mail_txt, features="html.parser", parse_only=SoupStrainer("table", {"class": "table_lr"}))
+    rows = soup.find_all("tr")
+    link = rows[-1].find("a") if rows else None
+    if not link or not link.get("href"):
+        raise MailLinkNotFoundError("EML link could not be found.")
+    return link["href"]
+
+
+def extract_mail_folders(mail_page, base_url: str = BASE_URL) -> dict:
+    folder_dropdown = as_page(mail_page).soup.find("select", {"name": "select_folder"})
+    folder_options = folder_dropdown.find_all("option")
+    return {
+        folder.get("id", "").replace("option_", ""): {
+            "description": folder.text.strip(),
+            "url": base_url + folder.get("value")
+        } for folder in folder_options
+    }
+
+
+def extract_compose_link(mail_page, base_url: str = BASE_URL) -> str:
+    links = as_page(mail_page).soup.find_all("a", {"class": "q_105592_1026"})
+    return base_url + "/wws/" + links[0]["data-popup"]
+
+
+def extract_send_link(compose_page_text: str, base_url: str = BASE_URL) -> str:
+    refresh_link = compose_page_text.split("var refresh_url=")[1].split(";")[0][1:-1]
+    return base_url + refresh_link
+
+
+def build_send_payload(receiver: list[str], cc: list[str], bcc: list[str], subject: str, body: str) -> dict:
+    return {
+        "call_no": "1",
+        "reply": "",
+        "reply_all": "",
+        "forward": "",
+        "mail_id": "",
+        "mail_folder": "",
+        "file_ids": "",
+        "confirm_loose_form_changes": "1",
+        "lock_to": "",
+        "lock_subject": "",
+        "in_reply_to": "",
+        "to": " ".join(receiver),
+        "cc": " ".join(cc),
+        "bcc": " ".join(bcc),
+        "subject": subject,
+        "body": body,
+        "file[]": "(binary)",
+        "send_mail": "Send e-mail",
+    }
+
+
+# quotes and line breaks in field and file names are percent-encoded, like browsers do
+def quote_field(value: str) -> str:
+    return value.replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+
+
+# a multipart/form-data body that reads attachments from disk while it is sent. its length is known
+# up front, so the request goes out with a Content-Length and never holds a whole file in memory
+class MultipartBody:
+    def __init__(self, fields: dict, files: list[tuple[str, str]], chunk_size: int = CHUNK_SIZE):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.chunk_size = chunk_size
+        # bytes, or the path of a file that is streamed in their place
+        self.parts: list = []
+        for name, value in fields.items():
+            self.parts.append(self.part_header(name) + str(value).encode() + b"\r\n")
+        # an empty file field without a path is what browsers send when nothing was attached
+        for name, path in files:
+            filename = os.path.basename(path) if path else ""
+            mime = (mimetypes.guess_type(filename)[0] if path else None) or "application/octet-stream"
+            self.parts.append(self.part_header(name, filename, mime))
+            if path:
+                self.parts.append(path)
+            self.parts.append(b"\r\n")
+        self.parts.append(f"--{self.boundary}--\r\n".encode())
+        self.size = sum(len(part) if isinstance(part, bytes) else os.path.getsize(part) for part in self.parts)
+
+    def part_header(self, name: str, filename: str = None, mime: str = None) -> bytes:
+        header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{quote_field(name)}"'
+        if filename is not None:
+            header += f'; filename="{quote_field(filename)}"\r\nContent-Type: {mime}'
+        return (header + "\r\n\r\n").encode()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+                continue
+            with open(part, "rb") as f:
+                yield from iter(lambda: f.read(self.chunk_size), b"")
+
+
+class OutgoingMail:
+    __slots__ = ("receiver", "subject", "body", "cc", "bcc", "attachments")
+
+    def __init__(
+        self,
+        receiver,
+        subject: str = "",
+        body: str = "",
+        cc: list[str] = None,
+        bcc: list[str] = None,
+        attachments: list[str] = None,
+    ):
+        self.receiver = [receiver] if isinstance(receiver, str) else list(receiver)
+        self.subject = subject
+        self.body = body
+        self.cc = cc or []
+        self.bcc = bcc or []
+        # local file paths
+        self.attachments = attachments or []
+
+    def __repr__(self):
+        return f"<OutgoingMail {self.subject!r} to {', '.join(self.receiver)}>"
+
+    # mail merge: one message per row, subject and body are format strings filled in from the row,
+    # which also holds the receiver and optionally its own attachments
+    @classmethod
+    def merge(cls, subject: str, body: str, rows: list[dict], attachments: list[str] = None, **kwargs) -> list:
+        return [
+            cls(row["receiver"], subject.format_map(row), body.format_map(row),
+                attachments=row.get("attachments", attachments), **kwargs)
+            for row in rows
+        ]
+
+
+class SendResult:
+    __slots__ = ("message", "ok", "status", "error")
+
+    def __init__(self, message: OutgoingMail, ok: bool, status: int = None, error: str = None):
+        self.message = message
+        self.ok = ok
+        self.status = status
+        self.error = error
+
+    def __repr__(self):
+        return f"<SendResult {self.message!r} ok={self.ok}>"
+
+
+def attachment_storage_path(attachments_folder: str, path: str) -> str:
+    # first number in path is random and useless for storage
+    return f"{attachments_folder}/{'/'.join(path.split('/', 2)[2:])}"
+
+
+class WebMailClient:
+    def __init__(
+        self,
+        auth_client: LoginClient,
+        parser: str = "html.parser",
+        store: MailStore = None,
+        folder: str = "inbox",
+    ):
+        self.auth_client: LoginClient = auth_client
+        self.parser = parser
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.session: requests.Session = self.auth_client.session
+        self.initial_mail_link: str = ""
+        self.mail_links: list[str] = []
+        self.mail_pages: list[MailPage] = []
+        self.mails: list[Mail] = []
+        self.failed_mails: list[tuple[Mail, Exception]] = []
+        self.failed_folders: list[tuple[str, str]] = []
+        self.folders: dict = {}
+        self.send_link: str = ""
+        self.send_link_fetched = 0.0
+        self._send_lock = threading.Lock()
+        # watch mode: refresh link of the watched folder and the numbers already seen in it
+        self.watch_link: str = ""
+        self.seen_numbers: set[int] = None
+
+        self.set_folder(folder)
+        self.store = store or MailStore(f"{self.auth_client.downloads_folder}/mail/mails.sqlite")
+
+    # loading mails from file
+    def load_mails_from_json(self):
+        self._logger.info(" -> loading mails from json...")
+
+        with open(f"{self.os_folder}/mails.json", "r") as f:
+            mail_json = json.load(f)
+        self.mails = [Mail.from_json(elem) for elem in mail_json]
+
+    def load_mails_from_store(self):
+        self._logger.info(" -> loading mails from store...")
+
+        self.mails = self.query_mails(folder=self.folder)
+
+    # filters are those of MailStore.query, dates as timestamps
+    def query_mails(self, **filters) -> list[Mail]:
+        return [Mail.from_json(data) for _, data in self.store.query(**filters)]
+
+    # ranked full-text search over every folder, see MailStore.search for the query syntax
+    def search_mails(self, query: str, **filters) -> list[tuple[str, Mail]]:
+        return [(folder, Mail.from_json(data)) for folder, data, _ in self.store.search(query, **filters)]
+
+    # INITIALISING
+    def get_mail_link(self):
+        self._logger.info(" -> extracting link to mail page")
+
+        self.initial_mail_link = self.auth_client.navigation.mail_link
+        if not self.initial_mail_link:
+            raise MailLinkNotFoundError("The link to the mail overview can't be found.")
+
+    def get_initial_page(self):
+        self._logger.info(" -> visiting mail page")
+
+        r = self.session.get(self.initial_mail_link)
+        self.mail_pages = [MailPage(r.text, self.parser)]
+        self.mails = []
+
+    def get_refresh_link(self):
+        self._logger.info(" -> extracting refresh link")
+
+        self.initial_mail_link = extract_refresh_link(self.mail_pages[0], self.auth_client.base_url)
+
+    def refresh(self):
+        self._logger.info(" -> refreshing mail page")
+
+        self.get_refresh_link()
+        self.get_initial_page()
+
+    # links to other mail pages in current folder
+    def find_other_mail_pages(self):
+        self._logger.info("-> extracting links to further mails")
+
+        self.mail_links = extract_other_mail_pages(self.mail_pages[0])
+        return self.mail_links
+
+    # crawl html of other mail pages
+    def get_all_mail_pages(self):
+        self._logger.info(" -> visiting all mail pages")
+        self.find_other_mail_pages()
+        for page in self.mail_links:
+            r = self.session.get(self.auth_client.base_url + page[0])
+            self.mail_pages.append(MailPage(r.text, self.parser))
+        return self.mail_pages
+
+    # get a mail html by url
+    def get_mail(self, mail: Mail):
+        r = self.session.get(self.auth_client.base_url + "/wws/" + mail.read_link)
+        return r.text
+
+    # STREAMING
+    # yields the mails of the current folder page by page, the next listing page is only requested
+    # once the consumer got through the previous one, so breaking out of the loop stops all crawling
+    def iter_pages(self):
+        r = self.session.get(self.initial_mail_link)
+        first_page = MailPage(r.text, self.parser)
+        yield first_page
+        for link in extract_other_mail_pages(first_page):
+            r = self.session.get(self.auth_client.base_url + link[0])
+            yield MailPage(r.text, self.parser)
+
+    # attachments are listed on the detail page, so downloading them implies fetching the bodies
+    def iter_mails(self, fetch_bodies: bool = False, download_attachments: bool = False, workers: int = 1):
+        self._logger.info(" -> streaming mails")
+
+        fetch_bodies = fetch_bodies or download_attachments
+        executor = None
+        if fetch_bodies and workers > 1:
+            self.auth_client.configure_pool(workers)
+            executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            for page in self.iter_pages():
+                mails = extract_mails(page)
+                if not fetch_bodies:
+                    yield from mails
+                    continue
+                # bodies are fetched at most one listing page ahead of the consumer
+                pending = [executor.submit(self.parse_mail, mail) for mail in mails] if executor else None
+                for i, mail in enumerate(mails):
+                    if pending:
+                        pending[i].result()
+                    else:
+                        self.parse_mail(mail)
+                    if download_attachments:
+                        for attachment in mail.attachments:
+                            self.download_attachment(attachment)
+                    yield mail
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+
+    # HTML PARSING
+    def parse_all_mail_pages(self):
+        self._logger.info(" -> parsing all mail pages")
+
+        for page in self.mail_pages:
+            self.parse_mail_page(mail_page_text=page)
+
+    def parse_mail_page(self, mail_page_text):
+        with self.auth_client.metrics.timer("lernsax_parse_seconds", step="parse_mail_page"):
+            self.mails.extend(extract_mails(as_page(mail_page_text, self.parser)))
+        return self.mails
+
+    def parse_all_mails(self, workers: int = 1, mails: list[Mail] = None):
+        self._logger.info(" -> downloading all mails")
+
+        mails = self.mails if mails is None else mails
+        errors: dict[int, Exception] = {}
+        if workers <= 1:
+            for i, mail in enumerate(tqdm(mails)):
+                try:
+                    self.parse_mail(mail)
+                except Exception as e:
+                    errors[i] = e
+        else:
+            self.auth_client.configure_pool(workers)
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self.parse_mail, mail): i for i, mail in enumerate(mails)}
+                for future in tqdm(as_completed(futures), total=len(futures)):
+                    if future.exception() is not None:
+                        errors[futures[future]] = future.exception()
+
+        # keep failures in the same order as the mails, independent of completion order
+        self.failed_mails = [(mails[i], errors[i]) for i in sorted(errors)]
+        for mail, error in self.failed_mails:
+            self._logger.warning(f" * could not download {mail}: {error!r}")
+        return self.failed_mails
+
+    def parse_mail(self, mail: Mail):
+        mail_txt = self.get_mail(mail)
+        with self.auth_client.metrics.timer("lernsax_parse_seconds", step="parse_mail"):
+            mail.add_info(**extract_mail_info(mail_txt, self.parser))
+
+    # DOWNLOAD HANDLING
+    def download_attachment(self, path: str) -> bool:
+        url = f"{self.auth_client.download_url}?path={path}"
+        downloaded = self.downloader.download(url, attachment_storage_path(self.attachments_folder, path))
+        self.downloader.manifest.save()
+        return downloaded
+
+    def download_attachments(self, workers: int = 1):
+        self._logger.info(" -> downloading attachments")
+
+        # forwarded mails share attachments, every file is only fetched once
+        jobs = {}
+        for mail in self.mails:
+            for attachment in mail.attachments:
+                path = attachment_storage_path(self.attachments_folder, attachment)
+                jobs.setdefault(path, f"{self.auth_client.download_url}?path={attachment}")
+        failed = self.downloader.download_all([(url, path) for path, url in jobs.items()], workers=workers)
+        for url, error in failed:
+            self._logger.warning(f" * could not download attachment {url!r}: {error!r}")
+        return failed
+
+    def dump_mails(self, workers: int = 1):
+        with self.auth_client.metrics.timer("lernsax_disk_write_seconds", step="store"):
+            self.store.upsert(self.folder, self.mails)
+        self.download_attachments(workers=workers)
+
+    # the store replaces the per-folder mails.json, which can still be written for other tools
+    def export_json(self):
+        mails = render_mail_list(self.mails)
+        with self.auth_client.metrics.timer("lernsax_disk_write_seconds", step="json"):
+            with open(f"{self.os_folder}/mails.json", "w+") as f:
+                json.dump(mails, f, indent=4, ensure_ascii=False)
+
+    # INCREMENTAL SYNC
+    # folders downloaded before the store existed are imported from their mails.json once
+    def import_legacy_json(self):
+        if self.store.count(self.folder) or not os.path.exists(f"{self.os_folder}/mails.json"):
+            return
+        self._logger.info(f" -> importing {self.os_folder}/mails.json into the store")
+        with open(f"{self.os_folder}/mails.json", "r") as f:
+            self.store.upsert(self.folder, [Mail.from_json(elem) for elem in json.load(f)])
+
+    def sync_mails(self, workers: int = 1):
+        self._logger.info(" -> syncing mails")
+
+        self.import_legacy_json()
+        known = self.store.states(self.folder)
+
+        self.get_all_mail_pages()
+        self.parse_all_mail_pages()
+        unchanged = self.store.get_many(
+            self.folder, [mail.number for mail in self.mails if mail.number in known and known[mail.number] == mail.flags]
+        )
+        outdated = []
+        for mail in self.mails:
+            stored = unchanged.get(mail.number)
+            if stored is None:
+                outdated.append(mail)
+                continue
+            mail.add_info(content=stored["content"], attachments=stored["attachments"], eml_link=stored.get("eml_link"))
+        self._logger.info(f" -> {len(outdated)} of {len(self.mails)} mails are new or changed")
+
+        self.parse_all_mails(workers=workers, mails=outdated)
+        self.dump_mails(workers=workers)
+
+    # SEND HANDLING
+    # the send link of the compose form is fetched once and shared by all senders until it gets too old,
+    # or until the link a sender got rejected with (stale) is still the current one
+    def get_send_link(self, max_age: float = SEND_FORM_MAX_AGE, stale: str = None) -> str:
+        with self._send_lock:
+            if self.send_link and self.send_link != stale and time.monotonic() - self.send_link_fetched < max_age:
+                return self.send_link
+            self._logger.info(" -> fetching compose form")
+            if not self.initial_mail_link:
+                self.get_mail_link()
+            r = self.session.get(self.initial_mail_link)
+            c = self.session.get(extract_compose_link(MailPage(r.text, self.parser), self.auth_client.base_url))
+            self.send_link = extract_send_link(c.text, self.auth_client.base_url)
+            self.send_link_fetched = time.monotonic()
+            return self.send_link
+
+    def post_mail(self, message: OutgoingMail, max_age: float = SEND_FORM_MAX_AGE) -> requests.Response:
+        send_link = self.get_send_link(max_age)
+        for attempt in range(2):
+            fields = build_send_payload(message.receiver, message.cc, message.bcc, message.subject, message.body)
+            del fields["file[]"]
+            body = MultipartBody(fields, [("file[]", path) for path in message.attachments] or [("file[]", None)])
+            r = self.session.post(send_link, data=body, headers={"Content-Type": body.content_type})
+            if r.status_code not in STALE_FORM_STATUS or attempt:
+                break
+            # a rejected form did not send anything, so posting again with a fresh one is safe
+            self._logger.info(f" -> compose form rejected with {r.status_code}, fetching a new one")
+            send_link = self.get_send_link(max_age, stale=send_link)
+        r.raise_for_status()
+        return r
+
+    def send_mail(self, receiver: list[str], cc: list[str] = None, bcc: list[str] = None, attachments: list[str] = None, **kwargs):
+        subject = kwargs.get("subject", f"Mail to {receiver}")
+        body = kwargs.get("body", f"Hello {receiver}")
+        return self.post_mail(OutgoingMail(receiver, subject, body, cc, bcc, attachments))
+
+    # sends many messages over one compose form, with at most workers posts at a time and at most
+    # rate posts per second. sends are never retried, results come in the order of the messages
+    def send_mails(
+        self,
+        messages: list[OutgoingMail],
+        workers: int = 4,
+        rate: float = 2.0,
+        burst: int = 4,
+        max_age: float = SEND_FORM_MAX_AGE,
+    ) -> list[SendResult]:
+        self._logger.info(f" -> sending {len(messages)} mails")
+
+        rate_limiter = HostRateLimiter(rate, burst) if rate else None
+        host = urlparse(self.auth_client.base_url).hostname
+        self.auth_client.configure_pool(workers)
+        self.get_send_link(max_age)
+
+        def send(message: OutgoingMail) -> requests.Response:
+            if rate_limiter is not None:
+                rate_limiter.acquire(host)
+            return self.post_mail(message, max_age)
+
+        results: list[SendResult] = [None] * len(messages)
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            futures = {executor.submit(send, message): i for i, message in enumerate(messages)}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                message = messages[futures[future]]
+                error = future.exception()
+                if error is None:
+                    results[futures[future]] = SendResult(message, True, future.result().status_code)
+                    continue
+                self._logger.warning(f" * sending {message} failed: {error!r}")
+                response = getattr(error, "response", None)
+                results[futures[future]] = SendResult(
+                    message, False, response.status_code if response is not None else None, repr(error)
+                )
+        self._logger.info(f" -> sent {sum(result.ok for result in results)} of {len(messages)} mails")
+        return results
+
+    # FOLDER HANDLING
+    def find_mail_folders(self):
+        self._logger.info(" -> finding mail folders")
+        self.get_initial_page()
+        self.folders = extract_mail_folders(self.mail_pages[0], self.auth_client.base_url)
+
+    # local paths and attachment manifest of a folder, without visiting it
+    def set_folder(self, folder: str):
+        self.folder = folder
+        self.os_folder = f"{self.auth_client.downloads_folder}/mail/{folder}"
+        self.attachments_folder = f"{self.os_folder}/attachments"
+        os.makedirs(self.attachments_folder, exist_ok=True)
+        self.downloader = Downloader(
+            self.session, DownloadManifest(f"{self.attachments_folder}/.manifest.json"), metrics=self.auth_client.metrics
+        )
+
+    def switch_mail_folder(self, folder: str):
+        self._logger.info(f" -> switching to mail folder {folder!r}")
+
+        self.initial_mail_link = self.folders[folder]["url"]
+        self.get_initial_page()
+        self.set_folder(folder)
+
+    # WATCH MODE
+    # the folder links of the old session are stale after a new login. the current folder is looked up again,
+    # starting over from the mail link alone would quietly continue in the inbox
+    def reopen_folder(self):
+        self.initial_mail_link, self.mail_pages, self.watch_link = "", [], ""
+        self.get_mail_link()
+        self.find_mail_folders()
+        if self.folder not in self.folders:
+            raise MailLinkNotFoundError(f"The mail folder {self.folder!r} can't be found.")
+        self.switch_mail_folder(self.folder)
+
+    # the first listing page of the folder through its refresh link, parsed down to the jail_table rows only
+    def fetch_watch_page(self) -> MailPage:
+        if not self.watch_link:
+            if not self.mail_pages:
+                if not self.initial_mail_link:
+                    self.get_mail_link()
+                self.get_initial_page()
+            self.watch_link = extract_refresh_link(self.mail_pages[0], self.auth_client.base_url)
+        r = self.session.get(self.watch_link)
+        r.raise_for_status()
+        return MailPage(r.text, self.parser)
+
+    # one poll of the current folder, returns the mails that came in since the last one, oldest first.
+    # the first poll only takes note of what is there, or of what the store knows for the folder.
+    # a mail is only taken as seen once its body could be fetched, so failed ones come again next poll
+    def poll_new_mails(self, fetch_bodies: bool = True) -> list[Mail]:
+        page = self.fetch_watch_page()
+        # a login form means the session ran out and the poll logs in again once. a logged-in page
+        # without listing is an empty folder
+        if not is_logged_in_page(page.text):
+            self._logger.info(" -> session expired, logging in again")
+            self.auth_client.login()
+            self.reopen_folder()
+            page = self.fetch_watch_page()
+            if not is_logged_in_page(page.text):
+                raise UnsuccessfulLoginError("Session could not be restored")
+        with self.auth_client.metrics.timer("lernsax_parse_seconds", step="poll"):
+            mails = extract_mails(page)
+
+        if self.seen_numbers is None:
+            self.seen_numbers = set(self.store.states(self.folder)) or {mail.number for mail in mails}
+        new = [mail for mail in mails if mail.number not in self.seen_numbers]
+        # with nothing known on the first page more mails came in than fit on it, the older pages are
+        # followed until a known mail shows up. only here the whole page is parsed, for the page links
+        if new and len(new) == len(mails) and self.seen_numbers:
+            for link in extract_other_mail_pages(page):
+                r = self.session.get(self.auth_client.base_url + link[0])
+                listed = extract_mails(MailPage(r.text, self.parser))
+                older = [mail for mail in listed if mail.number not in self.seen_numbers]
+                new.extend(older)
+                if len(older) < len(listed):
+                    break
+        if not new:
+            return []
+
+        fetched = []
+        for mail in new:
+            if fetch_bodies:
+                try:
+                    self.parse_mail(mail)
+                except Exception as e:
+                    self._logger.warning(f" * could not fetch new mail {mail}: {e!r}")
+                    continue
+            fetched.append(mail)
+        self.seen_numbers.update(mail.number for mail in fetched)
+        if fetch_bodies and fetched:
+            self.store.upsert(self.folder, fetched)
+        self._logger.info(f" -> {len(fetched)} new mails in {self.folder!r}")
+        return fetched[::-1]
+
+    # polls the current folder until stopped, calling callback(client, mail) for every new mail.
+    # for many accounts at once see watch.MailWatcher, which this runs with a single client
+    def watch(self, callback, min_interval: float = 30.0, max_interval: float = 600.0, fetch_bodies: bool = True):
+        from .watch import MailWatcher
+
+        watcher = MailWatcher([self], min_interval=min_interval, max_interval=max_interval, fetch_bodies=fetch_bodies)
+        watcher.run(callback)
+
+    # EML EXPORT
+    # the raw message of a mail, with the eml link from the store or a light parse of the detail page
+    def export_mail(self, mail: Mail, writer):
+        if not mail.eml_link:
+            r = self.session.get(self.auth_client.base_url + "/wws/" + mail.read_link)
+            mail.eml_link = extract_eml_link(r.text)
+        with self.session.get(self.auth_client.base_url + "/wws/" + mail.eml_link, stream=True) as r:
+            r.raise_for_status()
+            with self.auth_client.metrics.timer("lernsax_disk_write_seconds", step="eml"):
+                written = writer.add(
+                    mail.number,
+                    r.iter_content(chunk_size=CHUNK_SIZE),
+                    flags=maildir_flags(mail.flagged, mail.answered, mail.read) if mail.flags is not None else "",
+                    sender=mail.author_address,
+                    timestamp=mail.timestamp,
+                )
+        self.auth_client.metrics.inc("lernsax_disk_write_bytes_total", written, step="eml")
+
+    # writes the raw messages of every folder to <target>/<folder> (maildir) or <target>/<folder>.mbox,
+    # messages listed in the checkpoint of an earlier run are skipped
+    def export_eml(self, target: str = None, mailbox_format: str = "maildir", workers: int = 8, folders: list[str] = None) -> dict:
+        if mailbox_format not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format {mailbox_format!r}, expected one of {EXPORT_FORMATS}")
+        target = target or f"{self.auth_client.downloads_folder}/mail/export/{mailbox_format}"
+        checkpoint = ExportCheckpoint(f"{target}/.checkpoint")
+        self.auth_client.configure_pool(workers)
+        result = {"exported": 0, "skipped": 0, "failed": []}
+
+        self.get_mail_link()
+        self.find_mail_folders()
+        try:
+            for folder in folders or list(self.folders):
+                self.switch_mail_folder(folder)
+                self.get_all_mail_pages()
+                self.parse_all_mail_pages()
+                pending = [mail for mail in self.mails if not checkpoint.is_done(folder, mail.number)]
+                result["skipped"] += len(self.mails) - len(pending)
+                # links saved by earlier runs spare the detail page requests
+                stored = self.store.get_many(folder, [mail.number for mail in pending])
+                for mail in pending:
+                    if mail.number in stored:
+                        mail.eml_link = stored[mail.number].get("eml_link")
+                self._logger.info(f" -> exporting {len(pending)} mails of {folder!r}, {result['skipped']} done before")
+
+                if mailbox_format == "maildir":
+                    writer = MaildirWriter(f"{target}/{folder}", folder, checkpoint, urlparse(self.auth_client.base_url).hostname)
+                else:
+                    writer = MboxWriter(f"{target}/{folder}.mbox", folder, checkpoint)
+                try:
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = {executor.submit(self.export_mail, mail, writer): mail for mail in pending}
+                        for future in tqdm(as_completed(futures), total=len(futures)):
+                            if future.exception() is not None:
+                                self._logger.warning(f" * exporting mail {futures[future].number} failed: {future.exception()!r}")
+                                result["failed"].append((folder, futures[future].number, repr(future.exception())))
+                            else:
+                                result["exported"] += 1
+                finally:
+                    writer.close()
+        finally:
+            checkpoint.close()
+        self._logger.info(f" -> exported {result['exported']} mails to {target!r}, {len(result['failed'])} failed")
+        return result
+
+    # FOLDER CONTEXTS
+    # a client of its own for one folder, sharing the login, session, store and folder list with this one.
+    # listing pages, mails and download paths are per context, so several folders can be crawled at once.
+    # the context starts out in its folder and never touches the paths or manifest of the inbox
+    def folder_context(self, folder: str) -> "WebMailClient":
+        context = WebMailClient(self.auth_client, self.parser, store=self.store, folder=folder)
+        context.folders = self.folders
+        context.initial_mail_link = self.folders[folder]["url"]
+        context.get_initial_page()
+        return context
+
+    def download_folder(self, folder: str, workers: int = 1, incremental: bool = False) -> "WebMailClient":
+        self._logger.info(f" -> downloading folder {folder}")
+        context = self.folder_context(folder)
+        if incremental:
+            context.sync_mails(workers=workers)
+            return context
+        context.get_all_mail_pages()
+        context.parse_all_mail_pages()
+        context.parse_all_mails(workers=workers)
+        context.dump_mails(workers=workers)
+        return context
+
+    # download EVERYTHING
+    # folders run side by side, each with up to workers requests of its own. how many requests are in flight
+    # overall is left to the limiter of the transport, which every context shares through the session
+    def download_everything(self, workers: int = 1, incremental: bool = False, folder_workers: int = None):
+        self._logger.info(" -> downloading EVERYTHING")
+        self.get_mail_link()
+        self.find_mail_folders()
+        folder_workers = folder_workers or len(self.folders) or 1
+        self.auth_client.configure_pool(folder_workers * workers)
+
+        self.failed_mails, self.failed_folders = [], []
+        with ThreadPoolExecutor(max_workers=folder_workers) as executor:
+            futures = {
+                executor.submit(self.download_folder, folder, workers, incremental): folder for folder in self.folders
+            }
+            for future in as_completed(futures):
+                folder = futures[future]
+                if future.exception() is not None:
+                    self._logger.warning(f" * downloading folder {folder!r} failed: {future.exception()!r}")
+                    self.failed_folders.append((folder, repr(future.exception())))
+                    continue
+                self.failed_mails.extend(future.result().failed_mails)
+        self._logger.info(
+            f" -> downloaded {len(self.folders) - len(self.failed_folders)} of {len(self.folders)} folders, "
+            f"{len(self.failed_mails)} mails failed"
+        )
+        return self.failed_folders
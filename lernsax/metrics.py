@@ -0,0 +1,182 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    # prometheus buckets are cumulative
+    def cumulative(self) -> list[tuple[str, int]]:
+        result, total = [], 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((repr(bound), total))
+        result.append(("+Inf", self.count))
+        return result
+
+
+def format_labels(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+# counters and histograms keyed by metric name and a sorted tuple of label pairs
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: dict[tuple[str, tuple], float] = {}
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted((label, str(v)) for label, v in labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted((label, str(v)) for label, v in labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (key, labels), value in sorted(self.counters.items()):
+                    if key == name:
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (key, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if key != name:
+                        continue
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{format_labels(labels, (('le', bound),))} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "mean": histogram.sum / histogram.count if histogram.count else None,
+                    } for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+                ],
+            }
+
+    # .prom files get the prometheus text format, anything else a json summary
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w+") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus())
+            else:
+                json.dump(self.to_json(), f, indent=4)
+
+
+# shared by every client that is not given its own registry
+REGISTRY = Metrics()
+
+
+def endpoint_category(url: str) -> str:
+    parsed = urlparse(url)
+    if parsed.path.endswith("download.php"):
+        return "download"
+    if "webdav.php" in parsed.path:
+        return "webdav"
+    if parsed.path.endswith("105592.php"):
+        if "mail_id" in parsed.query:
+            return "mail_read"
+        return "mail_list"
+    if parsed.path.endswith("100001.php") or parsed.path in ("", "/"):
+        return "login"
+    return "page"
+
+
+# records latency (time to headers), size, status and endpoint category of every response of a session
+def instrument_session(session, metrics: Metrics = REGISTRY):
+    def record(r, *args, **kwargs):
+        category = endpoint_category(r.url)
+        metrics.inc("lernsax_requests_total", category=category, status=r.status_code)
+        metrics.observe("lernsax_request_seconds", r.elapsed.total_seconds(), category=category)
+        # reading the body of a streamed response here would defeat the streaming
+        if kwargs.get("stream"):
+            size = int(r.headers.get("Content-Length", 0))
+        else:
+            size = len(r.content)
+        metrics.inc("lernsax_response_bytes_total", size, category=category)
+
+    session.hooks["response"].append(record)
+
+
+# PROFILING
+@contextmanager
+def profile_run(cpu_profile: str = None, trace_memory: bool = False, top: int = 20):
+    logger = logging.getLogger("profile_run")
+    profiler = cProfile.Profile() if cpu_profile else None
+    if profiler:
+        profiler.enable()
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(cpu_profile)
+            logger.info(f" * cpu profile written to {cpu_profile!r}")
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            logger.info(f" * peak traced memory: {peak / 1024 ** 2:.1f} MiB")
+            for stat in snapshot.statistics("lineno")[:top]:
+                logger.info(f"   {stat}")
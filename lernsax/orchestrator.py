@@ -0,0 +1,208 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .auth import LoginClient, SessionCache, load_all_creds
+from .metrics import REGISTRY, profile_run
+from .transport import AdaptiveLimiter, HostRateLimiter, Transport
+
+
+# JOBS
+# a job gets a logged-in LoginClient and returns a json-serializable summary
+def mail_job(auth: LoginClient, workers: int = 4) -> dict:
+    from .mail import WebMailClient
+
+    client = WebMailClient(auth)
+    client.download_everything(workers=workers, incremental=True)
+    return {
+        "folders": len(client.folders),
+        "failed_folders": len(client.failed_folders),
+        "failed_mails": len(client.failed_mails),
+    }
+
+
+def webdav_job(auth: LoginClient, workers: int = 4) -> dict:
+    from .webdav import WebDAVClient
+
+    client = WebDAVClient(auth)
+    report = client.sync(workers=workers)
+    return {
+        "added": len(report["added"]),
+        "changed": len(report["changed"]),
+        "unchanged": report["unchanged"],
+        "deleted": len(report["deleted"]),
+        "failed": len(report["failed"]),
+    }
+
+
+def groups_job(auth: LoginClient, workers: int = 4) -> dict:
+    from .group import GroupClient
+
+    client = GroupClient(auth)
+    result = {"groups": 0, "files": 0, "failed_folders": 0, "failed_files": 0}
+    for name in client.get_groups():
+        root, errors = client.download_group(name, workers=workers)
+        result["groups"] += 1
+        result["files"] += len(root.files())
+        result["failed_folders"] += len(client.failed_folders)
+        result["failed_files"] += len(errors)
+    return result
+
+
+JOBS = {
+    "mail": mail_job,
+    "webdav": webdav_job,
+    "groups": groups_job,
+}
+
+
+class AccountResult:
+    def __init__(self, identifier: str, email: str = ""):
+        self.identifier = identifier
+        self.email = email
+        self.ok = False
+        self.error = None
+        self.login_time = 0.0
+        self.job_time = 0.0
+        self.result = None
+
+    def __repr__(self):
+        return f"<AccountResult {self.identifier!r} ok={self.ok}>"
+
+    def to_json(self) -> dict:
+        return {
+            "identifier": self.identifier,
+            "email": self.email,
+            "ok": self.ok,
+            "error": self.error,
+            "login_time": round(self.login_time, 3),
+            "job_time": round(self.job_time, 3),
+            "result": self.result,
+        }
+
+
+class Orchestrator:
+    def __init__(
+        self,
+        creds_file: str = "creds.json",
+        workers: int = 4,
+        job_workers: int = 4,
+        rate: float = 5.0,
+        burst: int = 5,
+        max_concurrency: int = 32,
+        timeout: float = 60.0,
+        retries: int = 3,
+        session_cache: SessionCache = None,
+    ):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.creds_file = creds_file
+        self.accounts: dict = load_all_creds(creds_file)
+        self.workers = workers
+        self.job_workers = job_workers
+        # one limiter for all accounts, so the request rate per host stays bounded however many run at once
+        self.rate_limiter = HostRateLimiter(rate, burst)
+        # the same goes for concurrency, which backs off for everyone once the server gets slow or fails
+        self.transport = Transport(
+            timeout=(10, timeout),
+            retries=retries,
+            rate_limiter=self.rate_limiter,
+            limiter=AdaptiveLimiter(maximum=max_concurrency),
+        )
+        self.session_cache = session_cache
+        self.results: list[AccountResult] = []
+        self.total_time = 0.0
+
+    def run_account(self, identifier: str, job) -> AccountResult:
+        user = self.accounts.get(identifier, {})
+        result = AccountResult(identifier, user.get("username", ""))
+        try:
+            auth = LoginClient(
+                user.get("username", ""),
+                user.get("password", ""),
+                session_cache=self.session_cache,
+                transport=self.transport,
+            )
+            start = time.perf_counter()
+            auth.login()
+            result.login_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result.result = job(auth, workers=self.job_workers)
+            result.job_time = time.perf_counter() - start
+            result.ok = True
+        except Exception as e:
+            self._logger.warning(f" * job for {identifier!r} failed: {e!r}")
+            result.error = repr(e)
+        return result
+
+    def run(self, job, identifiers: list[str] = None) -> list[AccountResult]:
+        if isinstance(job, str):
+            job = JOBS[job]
+        identifiers = list(self.accounts) if identifiers is None else identifiers
+        self._logger.info(f" * running {job.__name__} for {len(identifiers)} accounts")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.run_account, identifier, job): i for i, identifier in enumerate(identifiers)}
+            results = [None] * len(identifiers)
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+                self._logger.info(f" -> finished {results[futures[future]]}")
+        self.total_time = time.perf_counter() - start
+        self.results = results
+        return results
+
+    def summary(self) -> dict:
+        return {
+            "accounts": len(self.results),
+            "succeeded": sum(result.ok for result in self.results),
+            "failed": sum(not result.ok for result in self.results),
+            "total_time": round(self.total_time, 3),
+            "login_time": round(sum(result.login_time for result in self.results), 3),
+            "job_time": round(sum(result.job_time for result in self.results), 3),
+            "results": [result.to_json() for result in self.results],
+        }
+
+    def write_summary(self, path: str = "data/summary.json"):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w+") as f:
+            json.dump(self.summary(), f, indent=4, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level="INFO")
+
+    parser = argparse.ArgumentParser(description="Run a job for every account in creds.json")
+    parser.add_argument("job", choices=sorted(JOBS))
+    parser.add_argument("accounts", nargs="*", help="identifiers from creds.json, all accounts if omitted")
+    parser.add_argument("--creds", default="creds.json")
+    parser.add_argument("--workers", type=int, default=4, help="accounts processed at the same time")
+    parser.add_argument("--job-workers", type=int, default=4, help="parallel requests within one account")
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second and host, over all accounts")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="upper bound of parallel requests, over all accounts")
+    parser.add_argument("--timeout", type=float, default=60.0, help="read timeout of a request in seconds")
+    parser.add_argument("--retries", type=int, default=3, help="retries of failed idempotent requests")
+    parser.add_argument("--summary", default="data/summary.json")
+    parser.add_argument("--metrics", help="write request, parse and disk metrics here (.prom for prometheus text)")
+    parser.add_argument("--profile", help="write a cProfile dump of the run here")
+    parser.add_argument("--trace-memory", action="store_true", help="log the top allocations of the run")
+    args = parser.parse_args()
+
+    orchestrator = Orchestrator(
+        creds_file=args.creds,
+        workers=args.workers,
+        job_workers=args.job_workers,
+        rate=args.rate,
+        max_concurrency=args.max_concurrency,
+        timeout=args.timeout,
+        retries=args.retries,
+        session_cache=SessionCache(),
+    )
+    with profile_run(cpu_profile=args.profile, trace_memory=args.trace_memory):
+        orchestrator.run(args.job, args.accounts or None)
+    orchestrator.write_summary(args.summary)
+    if args.metrics:
+        REGISTRY.write(args.metrics)
@@ -0,0 +1,371 @@
+import html
+import json
+import os
+import re
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS mails (
+    folder TEXT NOT NULL,
+    number INTEGER NOT NULL,
+    timestamp INTEGER,
+    author_name TEXT,
+    author_address TEXT,
+    flags INTEGER,
+    size_bytes INTEGER,
+    fetched INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (folder, number)
+);
+CREATE INDEX IF NOT EXISTS mails_folder_timestamp ON mails (folder, timestamp);
+CREATE INDEX IF NOT EXISTS mails_timestamp ON mails (timestamp);
+CREATE INDEX IF NOT EXISTS mails_author_address ON mails (author_address);
+CREATE INDEX IF NOT EXISTS mails_author_name ON mails (author_name);
+CREATE INDEX IF NOT EXISTS mails_folder_flags ON mails (folder, flags);
+"""
+
+# full-text index, one row per mails row with the same rowid. it is contentless, the text is already in
+# mails.data, which halves the size of the database. prefix indexes keep prefix queries as fast as plain terms
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS mails_fts USING fts5 (
+    subject, content, author_name, author_address, attachments,
+    content = '',
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+"""
+SEARCH_COLUMNS = ("subject", "content", "author_name", "author_address", "attachments")
+# bm25 weights in SEARCH_COLUMNS order, a hit in the subject counts more than one in the body
+SEARCH_WEIGHTS = (10.0, 1.0, 5.0, 5.0, 3.0)
+# shorter field names accepted in queries, e.g. author:anna
+SEARCH_FIELD_ALIASES = {
+    "author": "{author_name author_address}",
+    "from": "{author_name author_address}",
+    "body": "content",
+    "attachment": "attachments",
+}
+TAG = re.compile(r"<[^>]+>")
+QUOTED = re.compile(r'("[^"]*")')
+# a parenthesis, a comma or a bare word outside of quotes, e.g. author:anna, klausur*, 10:30
+TOKEN = re.compile(r'[(),]|[^\s(),"]+')
+FIELD = re.compile(r"(-?)(\w+):(.*)")
+# what fts5 reads as a bareword: ascii letters and digits, _ and everything beyond ascii
+BAREWORD = re.compile(r"[0-9A-Za-z_\x1a\x80-\U0010ffff]+")
+
+
+def strip_html(content: str) -> str:
+    if not content:
+        return ""
+    return " ".join(html.unescape(TAG.sub(" ", content)).split())
+
+
+def search_document(data: dict) -> tuple:
+    return (
+        data.get("subject") or "",
+        strip_html(data.get("content")),
+        data.get("author_name") or "",
+        data.get("author_address") or "",
+        " ".join(os.path.basename(path) for path in data.get("attachments") or []),
+    )
+
+
+# words like anna.schmidt@schule.de, e-mail or 10:30 are no fts5 barewords and are searched as a phrase.
+# the initial token ^ and the prefix star stay outside, "10:30"* still matches 10:30 and 10:300
+def quote_term(term: str) -> str:
+    caret = "^" if term.startswith("^") else ""
+    star = "*" if term.endswith("*") else ""
+    core = term[len(caret):len(term) - len(star)]
+    if not core or BAREWORD.fullmatch(core):
+        return term
+    return f'{caret}"{core}"{star}'
+
+
+def translate_term(term: str) -> str:
+    field = FIELD.fullmatch(term)
+    if field is not None:
+        name = field[2].lower()
+        if name in SEARCH_FIELD_ALIASES or name in SEARCH_COLUMNS:
+            return f"{field[1]}{SEARCH_FIELD_ALIASES.get(name, name)}:{quote_term(field[3])}"
+    return quote_term(term)
+
+
+# rewrites the field aliases outside of quoted phrases, everything else is fts5 query syntax:
+# "exact phrase", prefix*, subject:word, AND / OR / NOT, NEAR(a b, 5). only known fields become column
+# filters and only barewords stay bare, so "meeting 10:30" or an address find what they say.
+# commas only mean something inside NEAR(...), elsewhere they separate words
+def translate_query(query: str) -> str:
+    depth = 0
+
+    def translate(m: re.Match) -> str:
+        nonlocal depth
+        if m[0] == "(":
+            depth += 1
+        elif m[0] == ")":
+            depth = max(depth - 1, 0)
+        elif m[0] == ",":
+            return m[0] if depth else " "
+        else:
+            return translate_term(m[0])
+        return m[0]
+
+    parts = QUOTED.split(query)
+    for i in range(0, len(parts), 2):
+        parts[i] = TOKEN.sub(translate, parts[i])
+    return "".join(parts)
+
+
+class SearchUnavailableError(Exception):
+    ...
+
+
+# sqlite archive of all mails of an account, one row per (folder, number) with the mail json in data.
+# rows go in and come out as Mail.to_json() dicts, the indexed columns are copied from the Mail object
+class MailStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        had_search = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'mails_fts'").fetchone()
+        # sqlite builds without fts5 keep the archive working, only search is unavailable
+        try:
+            self.conn.executescript(SEARCH_SCHEMA)
+            self.conn.execute("SELECT rowid FROM mails_fts LIMIT 0")
+            self.has_search = True
+        except sqlite3.OperationalError:
+            self.has_search = False
+        # stores from before the search index, or written to while it was unavailable, get it built once.
+        # user_version 1 marks an index that is missing mails
+        if self.has_search and (not had_search or self.conn.execute("PRAGMA user_version").fetchone()[0]):
+            self.reindex()
+
+    def close(self):
+        self.conn.close()
+
+    # a mail counts as fetched once its body was downloaded. rows that did not change are skipped,
+    # so upserting a whole folder again only touches the table and the search index for new or changed mails.
+    # a mail without body never replaces an archived one, e.g. after its fetch failed, only its listing fields do
+    def upsert(self, folder: str, mails: list) -> int:
+        documents = {mail.number: mail.to_json() for mail in mails}
+        rows = {
+            mail.number: (
+                folder,
+                mail.number,
+                mail.timestamp,
+                mail.author_name,
+                mail.author_address,
+                mail.flags,
+                mail.size_bytes,
+                int(mail.content is not None),
+                json.dumps(documents[mail.number], ensure_ascii=False),
+            ) for mail in mails
+        }
+        with self._lock, self.conn:
+            numbers = list(rows)
+            old = {}
+            for i in range(0, len(numbers), 500):
+                chunk = numbers[i:i + 500]
+                for number, rowid, fetched, data in self.conn.execute(
+                    f"SELECT number, rowid, fetched, data FROM mails WHERE folder = ? AND number IN ({','.join('?' * len(chunk))})",
+                    (folder, *chunk),
+                ):
+                    if fetched and not rows[number][7]:
+                        stored = json.loads(data)
+                        for key in ("content", "attachments", "eml_link"):
+                            documents[number][key] = stored.get(key)
+                        rows[number] = (*rows[number][:7], 1, json.dumps(documents[number], ensure_ascii=False))
+                    if rows[number][-1] == data:
+                        del rows[number]
+                    else:
+                        old[number] = (rowid, data)
+            self.conn.executemany(
+                "INSERT INTO mails VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (folder, number) DO UPDATE SET "
+                "timestamp=excluded.timestamp, author_name=excluded.author_name, "
+                "author_address=excluded.author_address, flags=excluded.flags, size_bytes=excluded.size_bytes, "
+                "fetched=excluded.fetched, data=excluded.data",
+                rows.values(),
+            )
+            for number in rows:
+                if number in old:
+                    rowid, data = old[number]
+                    self.unindex_document(rowid, json.loads(data))
+                else:
+                    rowid = self.conn.execute(
+                        "SELECT rowid FROM mails WHERE folder = ? AND number = ?", (folder, number)
+                    ).fetchone()[0]
+                self.index_document(rowid, documents[number])
+        return len(rows)
+
+    # SEARCH
+    # callers hold the lock and the transaction
+    def index_document(self, rowid: int, data: dict):
+        if not self.has_search:
+            self.conn.execute("PRAGMA user_version = 1")
+            return
+        self.conn.execute(
+            f"INSERT INTO mails_fts (rowid, {', '.join(SEARCH_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            (rowid, *search_document(data)),
+        )
+
+    # a contentless index can only forget a document when it is given the exact text that was indexed
+    def unindex_document(self, rowid: int, data: dict):
+        if not self.has_search:
+            return
+        self.conn.execute(
+            f"INSERT INTO mails_fts (mails_fts, rowid, {', '.join(SEARCH_COLUMNS)}) VALUES ('delete', ?, ?, ?, ?, ?, ?)",
+            (rowid, *search_document(data)),
+        )
+
+    def reindex(self):
+        if not self.has_search:
+            raise SearchUnavailableError("This sqlite build has no fts5, mails can't be searched.")
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO mails_fts (mails_fts) VALUES ('delete-all')")
+            for rowid, data in self.conn.execute("SELECT rowid, data FROM mails"):
+                self.index_document(rowid, json.loads(data))
+            # merges the index segments written row by row into one, smaller and faster to query
+            self.conn.execute("INSERT INTO mails_fts (mails_fts) VALUES ('optimize')")
+            self.conn.execute("PRAGMA user_version = 0")
+
+    def optimize(self):
+        if not self.has_search:
+            return
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO mails_fts (mails_fts) VALUES ('optimize')")
+
+    # query in fts5 syntax plus the aliases above, results come best first as (folder, mail dict, score)
+    def search(
+        self,
+        query: str,
+        folder: str = None,
+        since: int = None,
+        until: int = None,
+        limit: int = 50,
+        offset: int = 0,
+    ) -> list[tuple[str, dict, float]]:
+        if not self.has_search:
+            raise SearchUnavailableError("This sqlite build has no fts5, mails can't be searched.")
+        score = f"bm25(mails_fts, {', '.join(map(str, SEARCH_WEIGHTS))})"
+        clauses, params = ["mails_fts MATCH ?"], [translate_query(query)]
+        if folder is not None:
+            clauses.append("mails.folder = ?")
+            params.append(folder)
+        if since is not None:
+            clauses.append("mails.timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("mails.timestamp < ?")
+            params.append(until)
+        if len(clauses) == 1:
+            # without filters only the rows of the requested page are joined with mails
+            sql = (
+                f"SELECT mails.folder, mails.data, ranked.score FROM (SELECT rowid, {score} AS score FROM mails_fts "
+                "WHERE mails_fts MATCH ? ORDER BY score LIMIT ? OFFSET ?) AS ranked "
+                "JOIN mails ON mails.rowid = ranked.rowid ORDER BY ranked.score"
+            )
+        else:
+            sql = (
+                f"SELECT mails.folder, mails.data, {score} AS score "
+                "FROM mails_fts JOIN mails ON mails.rowid = mails_fts.rowid "
+                f"WHERE {' AND '.join(clauses)} ORDER BY score LIMIT ? OFFSET ?"
+            )
+        params += [limit, offset]
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        # bm25 is lower for better matches, the score is turned around so that higher is better
+        return [(folder, json.loads(data), -score) for folder, data, score in rows]
+
+    def count(self, folder: str = None) -> int:
+        with self._lock:
+            if folder is None:
+                return self.conn.execute("SELECT COUNT(*) FROM mails").fetchone()[0]
+            return self.conn.execute("SELECT COUNT(*) FROM mails WHERE folder = ?", (folder,)).fetchone()[0]
+
+    # number -> flags of every fetched mail in a folder, enough to decide what an incremental run has to fetch
+    def states(self, folder: str) -> dict:
+        with self._lock:
+            rows = self.conn.execute("SELECT number, flags FROM mails WHERE folder = ? AND fetched = 1", (folder,))
+            return dict(rows.fetchall())
+
+    def get(self, folder: str, number: int) -> dict:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT data FROM mails WHERE folder = ? AND number = ?", (folder, number)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, folder: str, numbers: list[int]) -> dict:
+        result = {}
+        numbers = list(numbers)
+        # stay below sqlite's limit of bound parameters
+        for i in range(0, len(numbers), 500):
+            chunk = numbers[i:i + 500]
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT number, data FROM mails WHERE folder = ? AND number IN ({','.join('?' * len(chunk))})",
+                    (folder, *chunk),
+                ).fetchall()
+            result.update((number, json.loads(data)) for number, data in rows)
+        return result
+
+    def query(
+        self,
+        folder: str = None,
+        number: int = None,
+        author: str = None,
+        since: int = None,
+        until: int = None,
+        read: bool = None,
+        flagged: bool = None,
+        limit: int = None,
+        newest_first: bool = True,
+    ):
+        clauses, params = [], []
+        if folder is not None:
+            clauses.append("folder = ?")
+            params.append(folder)
+        if number is not None:
+            clauses.append("number = ?")
+            params.append(number)
+        if author is not None:
+            clauses.append("(author_address = ? OR author_name = ?)")
+            params += [author, author]
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if read is not None:
+            clauses.append("flags & 1 = ?")
+            params.append(int(read))
+        if flagged is not None:
+            clauses.append("flags & 4 = ?")
+            params.append(4 * int(flagged))
+        sql = "SELECT rowid FROM mails"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY timestamp {'DESC' if newest_first else 'ASC'}, number"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        # only the rowids of the matches are read up front, the mails follow a page at a time,
+        # so iterating over the whole archive never holds more than one page of it in memory
+        with self._lock:
+            rowids = [rowid for rowid, in self.conn.execute(sql, params)]
+        for i in range(0, len(rowids), 500):
+            chunk = rowids[i:i + 500]
+            with self._lock:
+                rows = {
+                    rowid: (folder, data) for rowid, folder, data in self.conn.execute(
+                        f"SELECT rowid, folder, data FROM mails WHERE rowid IN ({','.join('?' * len(chunk))})", chunk
+                    )
+                }
+            # mails deleted since the rowids were read are left out
+            for rowid in chunk:
+                if rowid in rows:
+                    folder, data = rows[rowid]
+                    yield folder, json.loads(data)
@@ -0,0 +1,173 @@
+import threading
+import time
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# token bucket per host, shared by every session it is mounted on
+class HostRateLimiter:
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}
+
+    def acquire(self, host: str):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+# AIMD concurrency limit: grows by one per window of healthy responses, halves on errors or when
+# latency rises well above the best latency seen so far
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = 4,
+        minimum: int = 1,
+        maximum: int = 32,
+        decrease: float = 0.5,
+        latency_tolerance: float = 3.0,
+        latency_floor: float = 0.5,
+        cooldown: float = 1.0,
+    ):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.latency_floor = latency_floor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.baseline = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    # latency is None for requests whose duration says nothing about the server, only ok counts for those
+    def release(self, latency: float, ok: bool):
+        with self._cond:
+            self.in_flight -= 1
+            overloaded = not ok
+            if latency is not None:
+                # the baseline creeps up slowly, so a server that became slower for good is followed eventually
+                self.baseline = latency if self.baseline is None else min(latency, self.baseline * 1.01)
+                overloaded = overloaded or latency > max(self.latency_floor, self.latency_tolerance * self.baseline)
+            now = time.monotonic()
+            if overloaded:
+                # one congestion event usually fails many requests at once, only back off once for it
+                if now - self._last_decrease > self.cooldown:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PROPFIND"])
+# their duration includes sending the body, so it says little about how loaded the server is
+BODY_METHODS = frozenset(["PUT", "POST"])
+
+
+def build_retry(retries: int, backoff: float) -> Retry:
+    options = {
+        "total": retries,
+        "connect": retries,
+        "read": retries,
+        "status": retries,
+        "backoff_factor": backoff,
+        "status_forcelist": RETRY_STATUS,
+        "allowed_methods": IDEMPOTENT_METHODS,
+        "respect_retry_after_header": True,
+        "raise_on_status": False,
+    }
+    try:
+        # spreads retries of many clients that failed at the same moment
+        return Retry(backoff_jitter=backoff, **options)
+    except TypeError:
+        # urllib3 < 2 has no jitter
+        return Retry(**options)
+
+
+class TransportAdapter(HTTPAdapter):
+    def __init__(
+        self,
+        timeout=None,
+        rate_limiter: HostRateLimiter = None,
+        limiter: AdaptiveLimiter = None,
+        **kwargs,
+    ):
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(urlparse(request.url).hostname)
+        if self.limiter is None:
+            return super().send(request, **kwargs)
+
+        # the latency starts after the rate limiter, waiting for a token says nothing about the server.
+        # uploads and posts also spend it on sending their body, they only report errors
+        self.limiter.acquire()
+        start = time.monotonic()
+        ok = False
+        try:
+            r = super().send(request, **kwargs)
+            ok = r.status_code not in RETRY_STATUS
+            return r
+        finally:
+            self.limiter.release(None if request.method in BODY_METHODS else time.monotonic() - start, ok)
+
+
+# settings for the adapters of a session, shared by every session it is mounted on
+class Transport:
+    def __init__(
+        self,
+        timeout: tuple = (10, 60),
+        retries: int = 3,
+        backoff: float = 0.5,
+        pool_size: int = 10,
+        rate_limiter: HostRateLimiter = None,
+        limiter: AdaptiveLimiter = None,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter
+        self.limiter = limiter
+
+    def adapter(self, pool_size: int = None) -> TransportAdapter:
+        pool_size = pool_size or self.pool_size
+        return TransportAdapter(
+            timeout=self.timeout,
+            limiter=self.limiter,
+            rate_limiter=self.rate_limiter,
+            max_retries=build_retry(self.retries, self.backoff),
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+        )
+
+    def mount(self, session, pool_size: int = None):
+        adapter = self.adapter(pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
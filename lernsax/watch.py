@@ -0,0 +1,149 @@
+import asyncio
+import heapq
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
+
+from .mail import WebMailClient
+from .transport import HostRateLimiter
+
+
+# poll interval of one account: back to the minimum when mail came in, growing while the mailbox stays
+# quiet and faster on errors. the jitter keeps accounts that were polled together from staying in step
+class PollSchedule:
+    def __init__(
+        self,
+        minimum: float = 30.0,
+        maximum: float = 600.0,
+        growth: float = 1.5,
+        error_growth: float = 3.0,
+        jitter: float = 0.1,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.growth = growth
+        self.error_growth = error_growth
+        self.jitter = jitter
+        self.interval = minimum
+
+    def update(self, new: int, failed: bool = False) -> float:
+        if failed:
+            self.interval = min(self.maximum, self.interval * self.error_growth)
+        elif new:
+            self.interval = self.minimum
+        else:
+            self.interval = min(self.maximum, self.interval * self.growth)
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+
+# watches the current folder of many WebMailClients from one process. every account has its own schedule,
+# at most workers polls run at a time, and the first polls are spread evenly over the minimum interval,
+# so a process watching hundreds of mailboxes never sends them all at once
+class MailWatcher:
+    def __init__(
+        self,
+        clients: list[WebMailClient],
+        workers: int = 4,
+        min_interval: float = 30.0,
+        max_interval: float = 600.0,
+        rate: float = None,
+        fetch_bodies: bool = True,
+    ):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.clients = list(clients)
+        self.workers = workers
+        self.min_interval = min_interval
+        self.fetch_bodies = fetch_bodies
+        self.schedules = [PollSchedule(min_interval, max_interval) for _ in self.clients]
+        # polls per second over all accounts, on top of each client's own transport limits
+        self.rate_limiter = HostRateLimiter(rate, 1) if rate else None
+        # failed polls in a row per index into clients, an account leaves it with its next successful poll
+        self.failures: dict[int, int] = {}
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    # the accounts whose last poll failed
+    def failing(self) -> list[WebMailClient]:
+        return [self.clients[i] for i in sorted(self.failures)]
+
+    def poll(self, client: WebMailClient) -> list:
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(urlparse(client.auth_client.base_url).hostname)
+        return client.poll_new_mails(fetch_bodies=self.fetch_bodies)
+
+    # blocks until stop() or until duration seconds passed, callback(client, mail) runs in this thread
+    def run(self, callback, duration: float = None):
+        self._stop.clear()
+        start = time.monotonic()
+        spacing = self.min_interval / len(self.clients) if self.clients else 0
+        queue = [(start + i * spacing, i) for i in range(len(self.clients))]
+        heapq.heapify(queue)
+        self._logger.info(f" * watching {len(self.clients)} mailboxes")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            running = {}
+            while not self._stop.is_set() and (duration is None or time.monotonic() - start < duration):
+                now = time.monotonic()
+                while queue and queue[0][0] <= now and len(running) < self.workers:
+                    _, i = heapq.heappop(queue)
+                    running[executor.submit(self.poll, self.clients[i])] = i
+                # wakes up for the next due poll, a finished one, or at least once a second to notice stop()
+                timeout = min(1.0, max(0.0, queue[0][0] - now)) if queue else 1.0
+                if not running:
+                    self._stop.wait(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        self.failures[i] = self.failures.get(i, 0) + 1
+                        self._logger.warning(
+                            f" * polling {self.clients[i].auth_client.email!r} failed "
+                            f"({self.failures[i]} in a row): {error!r}"
+                        )
+                    else:
+                        self.failures.pop(i, None)
+                    mails = future.result() if error is None else []
+                    heapq.heappush(queue, (time.monotonic() + self.schedules[i].update(len(mails), error is not None), i))
+                    for mail in mails:
+                        callback(self.clients[i], mail)
+            # polls still running when stopped are waited for, their mails are delivered
+            for future in running:
+                if future.exception() is None:
+                    for mail in future.result():
+                        callback(self.clients[running[future]], mail)
+
+    # async iterator of (client, mail), the polls run in a thread of their own
+    async def iter_async(self, duration: float = None):
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        def deliver(client: WebMailClient, mail):
+            loop.call_soon_threadsafe(queue.put_nowait, (client, mail))
+
+        def run():
+            try:
+                self.run(deliver, duration=duration)
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                yield item
+        finally:
+            self.stop()
+
+    def __aiter__(self):
+        return self.iter_async()
@@ -0,0 +1,519 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote, urlparse
+import requests
+from tqdm import tqdm
+from webdav3.client import Client, WebDavXmlUtils
+from webdav3.exceptions import WebDavException
+from webdav3.urn import Urn
+
+from .auth import LoginClient
+from .download import CHUNK_SIZE, Downloader, DownloadManifest
+from .metrics import instrument_session
+
+# what sync does with local files whose remote counterpart is gone:
+# keep them, delete them, or move them to <local_dir>/.deleted/<date>/
+DELETE_POLICIES = ("keep", "delete", "archive")
+
+
+def parse_modified(value: str) -> int:
+    if not value:
+        return None
+    try:
+        return int(parsedate_to_datetime(value).timestamp())
+    except (TypeError, ValueError):
+        return None
+
+
+def parent_path(path: str) -> str:
+    parent = path.rstrip("/").rsplit("/", 1)[0]
+    return parent + "/"
+
+
+def path_depth(path: str) -> int:
+    return path.strip("/").count("/") + 1 if path.strip("/") else 0
+
+
+class DavEntry:
+    __slots__ = ("path", "is_dir", "size", "etag", "modified", "content_type")
+
+    def __init__(
+        self,
+        path: str,
+        is_dir: bool,
+        size: int = None,
+        etag: str = None,
+        modified: int = None,
+        content_type: str = None,
+    ):
+        # collections end with a slash, so paths of files and folders never collide
+        self.path = path
+        self.is_dir = is_dir
+        self.size = size
+        self.etag = etag
+        self.modified = modified
+        self.content_type = content_type
+
+    def __repr__(self):
+        return f"<DavEntry {self.path!r}>"
+
+    @property
+    def name(self) -> str:
+        return self.path.rstrip("/").rsplit("/", 1)[-1]
+
+    def to_json(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_json(cls, data: dict):
+        return cls(**data)
+
+
+# every entry of a share by its path, plus the children of every collection
+class DavTree:
+    def __init__(self, root: str = "/"):
+        self.root = root
+        self.entries: dict[str, DavEntry] = {root: DavEntry(root, True)}
+        self.children: dict[str, list[str]] = {root: []}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, path: str):
+        return path in self.entries
+
+    def get(self, path: str) -> DavEntry:
+        return self.entries.get(path)
+
+    def add(self, entry: DavEntry):
+        if entry.path in self.entries:
+            # the collection itself comes back in its own listing, keep the richer copy
+            self.entries[entry.path] = entry
+            return
+        self.entries[entry.path] = entry
+        if entry.is_dir:
+            self.children.setdefault(entry.path, [])
+        self.children.setdefault(parent_path(entry.path), []).append(entry.path)
+
+    def listdir(self, path: str = None) -> list[DavEntry]:
+        return [self.entries[child] for child in self.children.get(path or self.root, [])]
+
+    def walk(self, path: str = None):
+        stack = [path or self.root]
+        while stack:
+            current = stack.pop()
+            yield self.entries[current]
+            stack.extend(reversed(self.children.get(current, [])))
+
+    def files(self) -> list[DavEntry]:
+        return [entry for entry in self.entries.values() if not entry.is_dir]
+
+    def dirs(self) -> list[DavEntry]:
+        return [entry for entry in self.entries.values() if entry.is_dir]
+
+    def total_size(self) -> int:
+        return sum(entry.size or 0 for entry in self.files())
+
+    def to_json(self) -> dict:
+        return {
+            "root": self.root,
+            "entries": [entry.to_json() for entry in self.entries.values()],
+        }
+
+    @classmethod
+    def from_json(cls, data: dict):
+        tree = cls(data["root"])
+        for entry in data["entries"]:
+            tree.add(DavEntry.from_json(entry))
+        return tree
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w+") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(path) as f:
+            return cls.from_json(json.load(f))
+
+
+# remote path -> size, mtime and etag of every file an account got from upload_tree,
+# so an unchanged file whose remote copy still has the etag from our PUT is not sent again
+class UploadManifest:
+    def __init__(self, manifest_file: str):
+        self.manifest_file = manifest_file
+        self._lock = threading.Lock()
+        self.entries: dict = {}
+        if os.path.exists(manifest_file):
+            with open(manifest_file, "r") as f:
+                self.entries = json.load(f)
+
+    def get(self, path: str) -> dict:
+        return self.entries.get(path)
+
+    def set(self, path: str, size: int, mtime: int, etag: str):
+        with self._lock:
+            self.entries[path] = {"size": size, "mtime": mtime, "etag": etag}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(os.path.dirname(self.manifest_file) or ".", exist_ok=True)
+            with open(self.manifest_file + ".tmp", "w+") as f:
+                json.dump(self.entries, f)
+            os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+
+# file object handed to requests as a request body: it is read in chunks while sending and reports
+# every chunk, __len__ lets requests send a Content-Length instead of a chunked body
+class ProgressReader:
+    def __init__(self, f, size: int, callback=None, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.size = size
+        self.callback = callback
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return self.size
+
+    def read(self, n: int = -1) -> bytes:
+        chunk = self.f.read(self.chunk_size if n is None or n < 0 else n)
+        if chunk and self.callback:
+            self.callback(len(chunk))
+        return chunk
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), b"")
+
+
+class WebDAVClient:
+    def __init__(self, auth_client: LoginClient):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.auth_client = auth_client
+        options = {
+            "webdav_hostname": self.auth_client.webdav_url,
+            "webdav_login": self.auth_client.email,
+            "webdav_password": self.auth_client.password,
+        }
+        self.client = Client(options)
+        # same retries, timeouts and backpressure as the rest of the account's traffic
+        self.auth_client.transport.mount(self.client.session)
+        self.pool_size = self.auth_client.transport.pool_size
+        self._pool_lock = threading.Lock()
+        instrument_session(self.client.session, self.auth_client.metrics)
+        # hrefs in PROPFIND responses contain the path of the endpoint, e.g. /webdav.php/folder/
+        self.href_prefix = urlparse(self.auth_client.webdav_url).path.rstrip("/")
+        self.index_file = f"{self.auth_client.downloads_folder}/webdav/index.json"
+        # None until the first Depth: infinity request showed whether the server answers it
+        self.supports_infinity = None
+        self.failed_dirs: list[str] = []
+        self.tree: DavTree = None
+        # file downloads go through the session directly, so the credentials have to live on it
+        self.client.session.auth = (self.auth_client.email, self.auth_client.password)
+
+    # all PROPFIND, GET and PUT requests go through this session and not the login session, so its pool is
+    # sized here, growing only like LoginClient.configure_pool
+    def configure_pool(self, pool_size: int):
+        with self._pool_lock:
+            if pool_size > self.pool_size:
+                self.auth_client.transport.mount(self.client.session, pool_size)
+                self.pool_size = pool_size
+
+    def dav_path(self, href_path: str, is_dir: bool) -> str:
+        if self.href_prefix and href_path.startswith(self.href_prefix):
+            href_path = href_path[len(self.href_prefix):]
+        path = "/" + href_path.strip("/")
+        if is_dir and path != "/":
+            path += "/"
+        return path
+
+    def propfind(self, directory: str, depth: str = "1") -> list[DavEntry]:
+        response = self.client.execute_request(
+            action="list", path=Urn(directory, directory=True).quote(), headers_ext=[f"Depth: {depth}"]
+        )
+        return [
+            DavEntry(
+                self.dav_path(info["path"], info["isdir"]),
+                info["isdir"],
+                size=int(info["size"]) if info.get("size") and not info["isdir"] else None,
+                etag=info.get("etag"),
+                modified=parse_modified(info.get("modified")),
+                content_type=info.get("content_type"),
+            ) for info in WebDavXmlUtils.parse_get_list_info_response(response.content)
+        ]
+
+    # one Depth: infinity request for the whole share. Servers that refuse it answer 403 or 405,
+    # some silently answer with Depth: 1, in both cases the caller continues breadth-first
+    def propfind_infinity(self, root: str) -> list[DavEntry]:
+        try:
+            entries = self.propfind(root, depth="infinity")
+        except (WebDavException, requests.RequestException) as e:
+            self._logger.info(f" * Depth: infinity refused ({e!r}), mapping level by level")
+            self.supports_infinity = False
+            return None
+        root_depth = path_depth(root)
+        if any(path_depth(entry.path) > root_depth + 1 for entry in entries):
+            self.supports_infinity = True
+        elif any(entry.is_dir and entry.path != root for entry in entries):
+            self.supports_infinity = False
+        return entries
+
+    def map_dirs(self, root: str = "/", workers: int = 8, depth_infinity: bool = True, save: bool = True) -> DavTree:
+        root = "/" + root.strip("/") + "/" if root.strip("/") else "/"
+        tree = DavTree(root)
+        self.failed_dirs = []
+        self.configure_pool(workers)
+        self._logger.info(f" -> mapping WebDAV share from {root!r}")
+
+        pending = [root]
+        if depth_infinity and self.supports_infinity is not False:
+            entries = self.propfind_infinity(root)
+            if entries is not None:
+                for entry in entries:
+                    tree.add(entry)
+                # a shallow answer is a Depth: 1 listing, the subfolders still have to be mapped
+                pending = [] if self.supports_infinity else [child.path for child in tree.listdir(root) if child.is_dir]
+
+        # breadth-first, but a collection's children are requested as soon as its own listing is in
+        # instead of waiting for the whole level
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {executor.submit(self.propfind, directory): directory for directory in pending}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    directory = running.pop(future)
+                    try:
+                        entries = future.result()
+                    except (WebDavException, requests.RequestException) as e:
+                        self._logger.warning(f" * listing {directory!r} failed: {e!r}")
+                        self.failed_dirs.append(directory)
+                        continue
+                    for entry in entries:
+                        new = entry.path not in tree
+                        tree.add(entry)
+                        if new and entry.is_dir:
+                            running[executor.submit(self.propfind, entry.path)] = entry.path
+
+        self._logger.info(
+            f" -> mapped {len(tree.files())} files in {len(tree.dirs())} folders, "
+            f"{tree.total_size() / 1024 ** 2:.1f} MiB, {len(self.failed_dirs)} failed"
+        )
+        self.tree = tree
+        if save:
+            tree.save(self.index_file)
+        return tree
+
+    def load_index(self) -> DavTree:
+        self.tree = DavTree.load(self.index_file)
+        return self.tree
+
+    # SYNC
+    def file_url(self, path: str) -> str:
+        return self.auth_client.webdav_url.rstrip("/") + quote(path)
+
+    def local_path(self, local_dir: str, path: str) -> str:
+        parts = path.strip("/").split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            raise ValueError(f"unsafe remote path {path!r}")
+        return os.path.join(local_dir, *parts)
+
+    # an entry counts as changed when the remote etag, size or mtime differ from the manifest,
+    # or when the local copy is gone or has the wrong size
+    def is_changed(self, entry: DavEntry, known: dict, local_path: str) -> bool:
+        if not known:
+            return True
+        if entry.etag and known.get("etag") != entry.etag:
+            return True
+        if entry.size is not None and known.get("size") != entry.size:
+            return True
+        if entry.modified is not None and known.get("mtime") != entry.modified:
+            return True
+        return not os.path.exists(local_path) or os.path.getsize(local_path) != known["size"]
+
+    def remove_local(self, local_dir: str, local_path: str, policy: str):
+        if os.path.exists(local_path):
+            if policy == "archive":
+                target = os.path.join(local_dir, ".deleted", time.strftime("%Y-%m-%d"), os.path.relpath(local_path, local_dir))
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(local_path, target)
+            else:
+                os.remove(local_path)
+        # drop folders that became empty, up to the mirror root
+        folder = os.path.dirname(local_path)
+        while os.path.abspath(folder) != os.path.abspath(local_dir) and os.path.isdir(folder) and not os.listdir(folder):
+            os.rmdir(folder)
+            folder = os.path.dirname(folder)
+
+    def sync(self, local_dir: str = None, root: str = "/", workers: int = 8, delete: str = "keep") -> dict:
+        if delete not in DELETE_POLICIES:
+            raise ValueError(f"unknown deletion policy {delete!r}, expected one of {DELETE_POLICIES}")
+        local_dir = local_dir or f"{self.auth_client.downloads_folder}/webdav/files"
+        os.makedirs(local_dir, exist_ok=True)
+        manifest = DownloadManifest(f"{local_dir}/.manifest.json")
+        downloader = Downloader(self.client.session, manifest, metrics=self.auth_client.metrics, step="webdav")
+
+        tree = self.map_dirs(root, workers=workers)
+        report = {"added": [], "changed": [], "unchanged": 0, "deleted": [], "failed": []}
+        jobs, remote_paths = [], set()
+        for entry in tree.files():
+            try:
+                local_path = self.local_path(local_dir, entry.path[len(tree.root) - 1:])
+            except ValueError as e:
+                self._logger.warning(f" * skipping {entry.path!r}: {e}")
+                report["failed"].append((entry.path, repr(e)))
+                continue
+            remote_paths.add(os.path.relpath(local_path, local_dir))
+            known = manifest.get(local_path)
+            if not self.is_changed(entry, known, local_path):
+                report["unchanged"] += 1
+                continue
+            if known:
+                # the part file may hold the old version, and the manifest entry would make it look complete
+                manifest.remove(local_path)
+                if os.path.exists(local_path + ".part"):
+                    os.remove(local_path + ".part")
+            report["changed" if known else "added"].append(entry.path)
+            jobs.append((self.file_url(entry.path), local_path, {"etag": entry.etag, "mtime": entry.modified}))
+
+        self._logger.info(
+            f" -> syncing {len(report['added'])} new and {len(report['changed'])} changed files "
+            f"into {local_dir!r}, {report['unchanged']} unchanged"
+        )
+        errors = dict(downloader.download_all(jobs, workers=workers))
+        for url, local_path, meta in jobs:
+            if url in errors:
+                report["failed"].append((url, repr(errors[url])))
+            elif meta["mtime"] is not None:
+                # local mtimes follow the server, so tools like rsync see the same history
+                os.utime(local_path, (meta["mtime"], meta["mtime"]))
+
+        # a folder that could not be listed must not make its files look deleted
+        if delete != "keep" and not self.failed_dirs:
+            for relative in sorted(set(manifest.entries) - remote_paths):
+                self.remove_local(local_dir, os.path.join(local_dir, relative), delete)
+                manifest.remove(os.path.join(local_dir, relative))
+                report["deleted"].append(relative)
+            manifest.save()
+        elif delete != "keep":
+            self._logger.warning(f" * not deleting anything, {len(self.failed_dirs)} folders could not be listed")
+
+        self._logger.info(
+            f" -> synced {len(jobs) - len(errors)} files, {len(report['deleted'])} deleted, {len(report['failed'])} failed"
+        )
+        return report
+
+    # UPLOAD
+    def remote_path(self, remote_root: str, relative: str) -> str:
+        return remote_root + "/".join(relative.split(os.sep))
+
+    def mkcol(self, path: str) -> bool:
+        r = self.client.session.request("MKCOL", self.file_url(path))
+        # 405 means the collection exists already
+        if r.status_code == 405:
+            return False
+        r.raise_for_status()
+        return True
+
+    # collections are created level by level, parents first, every level in parallel
+    def create_collections(self, paths: list[str], workers: int = 8) -> list[tuple[str, str]]:
+        failed = []
+        levels: dict[int, list[str]] = {}
+        for path in paths:
+            levels.setdefault(path_depth(path), []).append(path)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for depth in sorted(levels):
+                # children of a folder that could not be created would fail as well
+                batch = [path for path in levels[depth] if not any(path.startswith(f) for f, _ in failed)]
+                futures = {executor.submit(self.mkcol, path): path for path in batch}
+                for future in as_completed(futures):
+                    if future.exception() is not None:
+                        self._logger.warning(f" * creating {futures[future]!r} failed: {future.exception()!r}")
+                        failed.append((futures[future], repr(future.exception())))
+        return failed
+
+    def put_file(self, local_path: str, remote_path: str, size: int, progress=None) -> str:
+        with open(local_path, "rb") as f:
+            r = self.client.session.put(self.file_url(remote_path), data=ProgressReader(f, size, progress))
+        r.raise_for_status()
+        return r.headers.get("ETag")
+
+    def upload_tree(self, local_dir: str, remote_root: str = "/", workers: int = 4) -> dict:
+        remote_root = "/" + remote_root.strip("/") + "/" if remote_root.strip("/") else "/"
+        manifest = UploadManifest(f"{self.auth_client.downloads_folder}/webdav/uploads.json")
+        tree = self.map_dirs(remote_root, workers=workers, save=False)
+        # a missing remote root shows up as a failed listing of the root itself
+        root_missing = remote_root in self.failed_dirs
+        if self.failed_dirs and not root_missing:
+            self._logger.warning(f" * {len(self.failed_dirs)} remote folders could not be listed, their files are uploaded again")
+
+        collections, files = [], []
+        if root_missing:
+            parts = remote_root.strip("/").split("/")
+            collections += ["/" + "/".join(parts[:i]) + "/" for i in range(1, len(parts) + 1)]
+        for folder, dirnames, filenames in os.walk(local_dir):
+            dirnames.sort()
+            relative_folder = os.path.relpath(folder, local_dir)
+            for dirname in dirnames:
+                remote = self.remote_path(remote_root, os.path.normpath(os.path.join(relative_folder, dirname))) + "/"
+                if root_missing or remote not in tree:
+                    collections.append(remote)
+            for filename in sorted(filenames):
+                local_path = os.path.join(folder, filename)
+                files.append((local_path, self.remote_path(remote_root, os.path.relpath(local_path, local_dir))))
+
+        report = {"uploaded": [], "skipped": 0, "collections": 0, "failed": [], "bytes": 0, "seconds": 0.0}
+        jobs = []
+        for local_path, remote in files:
+            stat = os.stat(local_path)
+            entry, known = tree.get(remote), manifest.get(remote)
+            if (
+                entry is not None and known is not None
+                and entry.size == stat.st_size == known["size"]
+                and int(stat.st_mtime) == known["mtime"]
+                and (known["etag"] is None or entry.etag == known["etag"])
+            ):
+                report["skipped"] += 1
+                continue
+            jobs.append((local_path, remote, stat.st_size, int(stat.st_mtime)))
+
+        start = time.perf_counter()
+        failed_collections = self.create_collections(collections, workers)
+        report["collections"] = len(collections) - len(failed_collections)
+        report["failed"] += failed_collections
+
+        total = sum(job[2] for job in jobs)
+        self._logger.info(
+            f" -> uploading {len(jobs)} files ({total / 1024 ** 2:.1f} MiB) to {remote_root!r}, {report['skipped']} unchanged"
+        )
+        try:
+            with tqdm(total=total, unit="B", unit_scale=True) as bar, ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self.put_file, local_path, remote, size, bar.update): (local_path, remote, size, mtime) for local_path, remote, size, mtime in jobs}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    local_path, remote, size, mtime = futures[future]
+                    if future.exception() is not None:
+                        self._logger.warning(f" * uploading {local_path!r} failed: {future.exception()!r}")
+                        report["failed"].append((remote, repr(future.exception())))
+                        continue
+                    manifest.set(remote, size, mtime, future.result())
+                    report["uploaded"].append(remote)
+                    report["bytes"] += size
+                    if done % 50 == 0:
+                        manifest.save()
+        finally:
+            manifest.save()
+
+        report["seconds"] = time.perf_counter() - start
+        self._logger.info(
+            f" -> uploaded {len(report['uploaded'])} files, {report['bytes'] / 1024 ** 2:.1f} MiB "
+            f"at {report['bytes'] / 1024 ** 2 / max(report['seconds'], 1e-9):.1f} MiB/s, {len(report['failed'])} failed"
+        )
+        return report
+
+    # defined last, the name would shadow the builtin in the annotations of the methods below it
+    def list(self, directory: str = "/"):
+        return self.client.list(directory)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from server import StandInServer  # noqa: E402
+
+
+# the stand-in LernSax server of the benchmarks, with a small newest-first mailbox
+@pytest.fixture
+def standin():
+    with StandInServer(mailbox_size=30, page_size=10, newest_first=True) as server:
+        yield server
+
+
+@pytest.fixture
+def login_client(standin, tmp_path):
+    from lernsax.auth import LoginClient
+
+    client = LoginClient("test@example.lernsax.de", "secret", data_dir=str(tmp_path), **standin.client_options)
+    client.login()
+    return client
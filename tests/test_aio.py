@@ -0,0 +1,37 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from server import attachment_body  # noqa: E402
+
+from lernsax.aio import AsyncLoginClient  # noqa: E402
+from lernsax.download import DownloadManifest, Downloader  # noqa: E402
+
+
+def download(standin, tmp_path, path: str, manifest: DownloadManifest, times: int = 1) -> list[bool]:
+    async def run():
+        async with AsyncLoginClient("test@example.lernsax.de", "secret", base_url=standin.url) as client:
+            url = f"{standin.url}/download.php?path={path}"
+            return await asyncio.gather(*(client.download(url, str(tmp_path / "a.bin"), manifest) for _ in range(times)))
+
+    return asyncio.run(run())
+
+
+def test_download_resumes_and_agrees_with_the_sync_client(standin, tmp_path):
+    body = attachment_body("1/mail/1/a.bin", standin.attachment_size)
+    (tmp_path / "a.bin.part").write_bytes(body[:1000])
+    manifest = DownloadManifest(str(tmp_path / ".manifest.json"))
+
+    requests = standin.requests
+    # concurrent downloads of one path share a single transfer
+    assert download(standin, tmp_path, "1/mail/1/a.bin", manifest, times=3) == [True, True, True]
+    assert standin.requests == requests + 1
+    assert (tmp_path / "a.bin").read_bytes() == body
+    assert not os.path.exists(tmp_path / "a.bin.part")
+
+    assert Downloader(None, manifest).is_complete(str(tmp_path / "a.bin"))
+    assert download(standin, tmp_path, "1/mail/1/a.bin", manifest) == [False]
+    assert standin.requests == requests + 1
@@ -0,0 +1,23 @@
+import os
+import stat
+
+import pytest
+
+from lernsax.auth import SessionCache
+
+
+@pytest.mark.skipif(os.name != "posix", reason="file modes are posix only")
+def test_session_cache_is_private(login_client, tmp_path):
+    cache = SessionCache(str(tmp_path / "cache"))
+    os.makedirs(cache.cache_dir, mode=0o755)
+    os.chmod(cache.cache_dir, 0o755)
+    path = cache.path(login_client.email)
+    with open(path, "w") as f:
+        f.write("{}")
+    os.chmod(path, 0o644)
+
+    cache.save(login_client.email, login_client.session, login_client.logged_in_page.url)
+
+    assert stat.S_IMODE(os.stat(cache.cache_dir).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert cache.load(login_client.email)["cookies"]
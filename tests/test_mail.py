@@ -0,0 +1,17 @@
+import os
+
+from lernsax.mail import WebMailClient
+
+
+def test_folder_context_leaves_the_inbox_alone(login_client):
+    client = WebMailClient(login_client, folder="sent")
+    client.get_mail_link()
+    client.find_mail_folders()
+    context = client.folder_context("trash")
+
+    mail_dir = f"{login_client.downloads_folder}/mail"
+    assert "inbox" not in os.listdir(mail_dir)
+    assert context.folder == "trash"
+    assert context.downloader.manifest.manifest_file == f"{mail_dir}/trash/attachments/.manifest.json"
+    assert "folder=trash" in context.initial_mail_link
+    assert context.store is client.store
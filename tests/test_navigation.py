@@ -0,0 +1,22 @@
+import pytest
+from pages import start_page
+
+from lernsax.auth import NavigationIndex
+from lernsax.group import GroupClient, GroupNotFoundError
+
+
+def test_index_only_holds_top_options():
+    index = NavigationIndex.from_page(start_page(groups=3, classes=2), "https://www.lernsax.de")
+    assert [entry.name for entry in index.entries("group")] == ["Group 0", "Group 1", "Group 2"]
+    assert [entry.name for entry in index.entries("class")] == ["Class 0", "Class 1"]
+    assert index.get("group", "Join a group") is None
+    assert index.mail_link == "https://www.lernsax.de/wws/105592.php?sid=1"
+
+
+def test_group_client_lookups(login_client):
+    client = GroupClient(login_client)
+    assert sorted(client.get_groups()) == [f"Class {i}" for i in range(2)] + [f"Group {i}" for i in range(5)]
+    assert client.get_group("Group 3").kind == "group"
+    assert client.get_languages() == {"Deutsch": "de", "English": "en"}
+    with pytest.raises(GroupNotFoundError):
+        client.get_group("Join a group")
@@ -0,0 +1,22 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import lernsax
+
+
+def test_import_loads_no_clients():
+    code = "import sys, lernsax; print(sorted(m for m in ('requests', 'bs4', 'aiohttp') if m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == "[]"
+
+
+@pytest.mark.parametrize("name", sorted(lernsax._EXPORTS))
+def test_exports_resolve(name):
+    if lernsax._EXPORTS[name] == "aio":
+        pytest.importorskip("aiohttp")
+    assert getattr(lernsax, name).__name__ == name
+    assert name in dir(lernsax)
@@ -0,0 +1,93 @@
+import pytest
+
+from lernsax.mail import Mail
+from lernsax.store import MailStore, SearchUnavailableError, translate_query
+
+
+def mail(number: int, subject: str, author_name: str, author_address: str, content: str) -> Mail:
+    return Mail(
+        number=number,
+        subject=subject,
+        author_name=author_name,
+        author_address=author_address,
+        date="14.11.2023 22:13",
+        flags=1,
+        content=content,
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = MailStore(str(tmp_path / "mails.sqlite"))
+    store.upsert("inbox", [
+        mail(1, "Treffen", "Anna Schmidt", "anna.schmidt@schule.de", "<p>meeting 10:30 im Raum 2</p>"),
+        mail(2, "Klausur", "Ben Müller", "ben.mueller@schule.de", "<p>Bitte die E-Mail von gestern lesen</p>"),
+        mail(3, "Hausaufgabe", "Clara Fischer", "clara@example.org", "<p>meeting 11:00, abgabe bis Freitag</p>"),
+    ])
+    yield store
+    store.close()
+
+
+def numbers(store: MailStore, query: str) -> list[int]:
+    return sorted(data["number"] for _, data, _ in store.search(query))
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("klausur", "klausur"),
+    ("meeting 10:30", 'meeting "10:30"'),
+    ("anna.schmidt@schule.de", '"anna.schmidt@schule.de"'),
+    ("from:anna.schmidt@schule.de", '{author_name author_address}:"anna.schmidt@schule.de"'),
+    ("e-mail", '"e-mail"'),
+    ("10:3*", '"10:3"*'),
+    ("^anna.schmidt", '^"anna.schmidt"'),
+    ("klausur OR NOT treffen", "klausur OR NOT treffen"),
+    ("NEAR(meeting abgabe, 5)", "NEAR(meeting abgabe, 5)"),
+    ("Schmidt, Anna", "Schmidt  Anna"),
+    ('"e-mail von" gestern', '"e-mail von" gestern'),
+    ("Subject:klausur body:abgabe*", "subject:klausur content:abgabe*"),
+])
+def test_translate_query(query, expected):
+    assert translate_query(query) == expected
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("anna.schmidt@schule.de", [1]),
+    ("from:anna.schmidt@schule.de", [1]),
+    ("author:schule.de", [1, 2]),
+    ("e-mail", [2]),
+    ("meeting 10:30", [1]),
+    ("meeting 11:00", [3]),
+    ("10:3*", [1]),
+    ("Schmidt, Anna", [1]),
+    ("NEAR(meeting abgabe, 3)", [3]),
+    ("subject:klausur OR body:freitag", [2, 3]),
+])
+def test_search(store, query, expected):
+    assert numbers(store, query) == expected
+
+
+def test_query_pages_through_the_archive(tmp_path):
+    store = MailStore(str(tmp_path / "mails.sqlite"))
+    store.upsert("inbox", [mail(number, f"Mail {number}", "Anna", "anna@schule.de", "<p>text</p>") for number in range(1, 1201)])
+    assert [data["number"] for _, data in store.query()] == list(range(1, 1201))
+    assert [data["number"] for _, data in store.query(limit=3)] == [1, 2, 3]
+    assert len(list(store.query(folder="sent"))) == 0
+    store.close()
+
+
+def test_store_without_fts5(tmp_path, monkeypatch):
+    path = str(tmp_path / "mails.sqlite")
+    monkeypatch.setattr("lernsax.store.SEARCH_SCHEMA", "CREATE VIRTUAL TABLE mails_fts USING missing_fts (subject)")
+    store = MailStore(path)
+    assert not store.has_search
+    store.upsert("inbox", [mail(1, "Klausur", "Anna", "anna@schule.de", "<p>Raum 2</p>")])
+    assert store.get("inbox", 1)["subject"] == "Klausur"
+    with pytest.raises(SearchUnavailableError):
+        store.search("klausur")
+    store.close()
+
+    # with fts5 available again the mails written without it are indexed on open
+    monkeypatch.undo()
+    store = MailStore(path)
+    assert numbers(store, "klausur") == [1]
+    store.close()
@@ -0,0 +1,31 @@
+from lernsax.mail import WebMailClient
+
+
+def watch_folder(login_client, folder: str) -> WebMailClient:
+    client = WebMailClient(login_client)
+    client.get_mail_link()
+    client.find_mail_folders()
+    client.switch_mail_folder(folder)
+    return client
+
+
+def test_first_poll_only_takes_note(login_client):
+    client = watch_folder(login_client, "inbox")
+    assert client.poll_new_mails() == []
+    assert len(client.seen_numbers) == 10
+
+
+def test_expired_session_keeps_watching_the_folder(standin, login_client):
+    client = watch_folder(login_client, "sent")
+    assert client.poll_new_mails() == []
+    assert "folder=sent" in client.watch_link
+
+    login_client.session.cookies.clear()
+    standin.mailbox_size += 2
+    new = client.poll_new_mails()
+
+    assert client.folder == "sent"
+    assert "folder=sent" in client.watch_link
+    assert [mail.number for mail in new] == [31, 32]
+    assert {31, 32} <= set(client.store.states("sent"))
+    assert not set(client.store.states("inbox"))